@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from check_intervals import check_intervals
+from create_test_midi import create_synthetic_midi
+
+# Workload name -> create_synthetic_midi arguments
+WORKLOADS = {
+    'notes_10k': dict(notes=10000),
+    'notes_100k': dict(notes=100000),
+    'notes_1m': dict(notes=1000000),
+    'dense_chords': dict(notes=100000, chord_size=6),
+    'many_tracks': dict(notes=100000, tracks=64),
+    'tempo_changes': dict(notes=100000, tempo_changes=5000),
+    'short_notes': dict(notes=100000, min_beats=1 / 32, max_beats=1 / 16),
+    'long_notes': dict(notes=10000, min_beats=8, max_beats=32),
+    # One note-on without a note_off lasts the whole piece; seek times must not grow towards the end
+    'orphaned_note': dict(notes=100000, orphaned_notes=1),
+}
+# Metric -> upper limit enforced by --check. A 1600x900 frame converted to RGB bytes
+# allocates about 4 MB, so anything near that means frames are being copied again.
+LIMITS = {
+    'encode_alloc_kb_per_frame': 64,
+}
+QUICK_WORKLOADS = ['notes_10k', 'dense_chords', 'tempo_changes', 'short_notes', 'long_notes', 'orphaned_note']
+
+
+def benchmark_workload(midi_file, frames, encode_frames, raster='pygame'):
+    """Time parsing, layout, per-frame rendering and encoding for one MIDI file"""
+    import mido
+    from main import SaxophoneVisualizer, open_video_sink, surface_pixel_format
+
+    result = {}
+    started = time.perf_counter()
+    midi = mido.MidiFile(midi_file)
+    result['parse_seconds'] = time.perf_counter() - started
+
+    visualizer = SaxophoneVisualizer(midi_file, headless=True, raster=raster)
+    started = time.perf_counter()
+    visualizer.process_midi_file(midi)
+    result['layout_seconds'] = time.perf_counter() - started
+    result['notes'] = len(visualizer.notes)
+
+    # Render frames spread evenly over the piece so every tile gets drawn
+    frame_count = visualizer.frame_count()
+    frame_indices = np.linspace(0, max(frame_count - 1, 0), frames).astype(int)
+    frame_times = []
+    for frame_index in frame_indices:
+        started = time.perf_counter()
+        visualizer.render_frame(visualizer.frame_time(frame_index))
+        frame_times.append(time.perf_counter() - started)
+    frame_times = np.array(frame_times) * 1000
+    result['frame_ms_mean'] = float(frame_times.mean())
+    result['frame_ms_p99'] = float(np.percentile(frame_times, 99))
+
+    # Seeking is an index lookup for the visible notes and the chart, wherever the target is
+    for name, fraction in (('start', 0.0), ('middle', 0.5), ('end', 1.0)):
+        seek_time = visualizer.frame_time(int(fraction * max(frame_count - 1, 0)))
+        started = time.perf_counter()
+        for _ in range(100):
+            visualizer.visible_notes(seek_time)
+            visualizer.chart_note(seek_time)
+        result[f'seek_us_{name}'] = (time.perf_counter() - started) / 100 * 1e6
+
+    pixel_format = surface_pixel_format(visualizer.screen)
+    with tempfile.TemporaryDirectory() as directory:
+        sink = open_video_sink(os.path.join(directory, 'benchmark.mp4'), visualizer.window_size, visualizer.fps,
+                               input_pix_fmt=pixel_format)
+        started = time.perf_counter()
+        for frame in visualizer.render_offline(0, min(encode_frames, frame_count)):
+            sink.write(frame)
+        sink.close()
+        result['encode_fps'] = min(encode_frames, frame_count) / (time.perf_counter() - started)
+        
+        # Bytes allocated inside sink.write, with and without reading the surface in place
+        for name, input_pix_fmt in (('encode_alloc_kb_per_frame', pixel_format),
+                                    ('encode_alloc_kb_per_frame_converted', None)):
+            sink = open_video_sink(os.path.join(directory, f'{name}.mp4'), visualizer.window_size,
+                                   visualizer.fps, input_pix_fmt=input_pix_fmt)
+            result[name] = write_allocations(sink, visualizer.render_offline(0, min(30, frame_count))) / 1024
+            sink.close()
+
+    visualizer.cleanup()
+    return result
+
+
+def write_allocations(sink, frames):
+    """Mean peak bytes allocated by sink.write per frame, as seen by tracemalloc"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for frame in frames:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            sink.write(frame)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(peaks)) if peaks else 0.0
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, baseline_file):
+    """Print each metric next to the same metric from an earlier results file"""
+    with open(baseline_file) as file:
+        baseline = json.load(file)
+    print(f"\nCompared with {baseline_file} ({baseline.get('revision')}):")
+    for name, metrics in results['workloads'].items():
+        old = baseline['workloads'].get(name)
+        if not old:
+            continue
+        for metric, value in metrics.items():
+            if metric in old and old[metric]:
+                print(f"  {name:<14} {metric:<16} {old[metric]:10.3f} -> {value:10.3f} ({value / old[metric]:5.2f}x)")
+
+
+def check(results):
+    """Metrics over their LIMITS, as (workload, metric, value, limit) tuples"""
+    failures = []
+    for name, metrics in results['workloads'].items():
+        for metric, limit in LIMITS.items():
+            if metric in metrics and metrics[metric] > limit:
+                failures.append((name, metric, metrics[metric], limit))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the saxophone visualizer on synthetic MIDI workloads")
+    parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS),
+                        help="workloads to run (default: all, or a quick subset with --quick)")
+    parser.add_argument('--quick', action='store_true', help="run the smaller workloads only")
+    parser.add_argument('--frames', type=int, default=300, help="frames to time per workload")
+    parser.add_argument('--encode-frames', type=int, default=300, help="frames to encode per workload")
+    parser.add_argument('--raster', choices=['pygame', 'numpy'], default='pygame',
+                        help="note rasterizer to benchmark")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='RESULTS_JSON', help="earlier results to compare against")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 if a metric is over its limit or an index query is wrong")
+    args = parser.parse_args()
+
+    names = args.workloads or (QUICK_WORKLOADS if args.quick else list(WORKLOADS))
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'raster': args.raster,
+        'workloads': {},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            print(f"Running {name}...")
+            midi_file = create_synthetic_midi(os.path.join(directory, f"{name}.mid"), **WORKLOADS[name])
+            results['workloads'][name] = benchmark_workload(midi_file, args.frames, args.encode_frames, args.raster)
+            print(json.dumps(results['workloads'][name], indent=2))
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    
+    if args.check:
+        failures = check(results)
+        for name, metric, value, limit in failures:
+            print(f"FAIL {name} {metric} = {value:.1f}, limit {limit}")
+        index_failures = check_intervals()
+        for failure in index_failures:
+            print(f"FAIL interval index {failure}")
+        if failures or index_failures:
+            raise SystemExit(1)
+        print("All metrics within limits, interval indexes match brute force")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+
+import numpy as np
+
+
+def random_notes(rng, count, now=100.0):
+    """Columns for `count` notes ending before `now`; a few are very long, like orphaned note-ons"""
+    lengths = rng.exponential(0.5, count)
+    lengths[rng.random(count) < 0.03] *= 200
+    end = now - rng.random(count) * 0.1
+    start = np.maximum(end - lengths, 0)
+    return dict(start=start, end=end, x=start * 100, length=(end - start) * 100,
+                note=rng.integers(49, 81, count))
+
+
+def brute_force(starts, ends, left, right):
+    return np.flatnonzero((starts <= right) & (ends > left))
+
+
+def check_queries(table, rng, now, queries=5):
+    """Mismatches between the table's indexes and a brute-force scan"""
+    failures = []
+    if not np.array_equal(np.sort(table.start, kind='stable'), table.start):
+        failures.append("rows are not sorted by start")
+    for _ in range(queries):
+        left = rng.random() * now
+        right = left + rng.random() * 5
+        expected = brute_force(table.start, table.end, left, right)
+        if not np.array_equal(table.time_index.query(left, right), expected):
+            failures.append(f"time_index.query({left}, {right})")
+        expected = brute_force(table.x, table.x + table.length, left * 100, right * 100)
+        if not np.array_equal(table.pixel_index.query(left * 100, right * 100), expected):
+            failures.append(f"pixel_index.query({left * 100}, {right * 100})")
+    return failures
+
+
+def check_intervals(trials=300, seed=0):
+    """Build note tables at once and by NoteTable.append, and compare every query with brute force.
+
+    Returns a list of failure descriptions, empty when everything matched.
+    """
+    from main import NoteTable
+
+    rng = np.random.default_rng(seed)
+    failures = []
+    for trial in range(trials):
+        # Built in one go
+        notes = random_notes(rng, int(rng.integers(0, 300)))
+        failures += [f"trial {trial} built: {failure}"
+                     for failure in check_queries(NoteTable.from_columns(**notes), rng, 100.0)]
+
+        # Grown the way a live stream grows it, with the indexes built early on
+        table = NoteTable()
+        columns = {name: [] for name in notes}
+        now = 0.0
+        for step in range(int(rng.integers(1, 200))):
+            now += rng.random()
+            batch = random_notes(rng, int(rng.integers(0, 4)), now)
+            for name, values in batch.items():
+                columns[name].append(values)
+            table.append(NoteTable.from_columns(**batch))
+            if step == 3:
+                table.time_index, table.pixel_index
+            if rng.random() < 0.3:
+                failures += [f"trial {trial} step {step}: {failure}" for failure in check_queries(table, rng, now)]
+
+        rebuilt = NoteTable.from_columns(**{name: np.concatenate(values) for name, values in columns.items()})
+        if not np.array_equal(np.sort(rebuilt.start), table.start):
+            failures.append(f"trial {trial}: appended rows differ from a rebuild")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the interval indexes and NoteTable.append against brute force")
+    parser.add_argument('--trials', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failures = check_intervals(args.trials, args.seed)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        raise SystemExit(1)
+    print(f"{args.trials} trials matched brute force")
+
+
+if __name__ == "__main__":
+    main()
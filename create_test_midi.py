@@ -1,7 +1,9 @@
-from midiutil import MIDIFile
 import os
+import random
 
 def create_test_midi():
+    from midiutil import MIDIFile
+    
     # Create a MIDI file with 1 track
     midi = MIDIFile(1)
     
@@ -98,5 +100,53 @@ def create_test_midi():
     print(f"MIDI file created: {os.path.abspath(filename)}")
     return filename
 
+def create_synthetic_midi(filename, notes=10000, tracks=1, chord_size=1, tempo_changes=0,
+                          min_beats=0.25, max_beats=2.0, ticks_per_beat=480, orphaned_notes=0, seed=0):
+    """Write a random saxophone-range MIDI file for benchmarking.
+    
+    notes: total number of notes, spread round-robin over `tracks`
+    chord_size: notes sounding together at each onset (dense chords)
+    tempo_changes: number of set_tempo events spread over the piece
+    min_beats, max_beats: range of note durations
+    orphaned_notes: notes at the start that never get a note_off, so they
+        last until the end of the first track; they are on channel 1,
+        where no later note re-triggers them
+    """
+    import mido
+    
+    rng = random.Random(seed)
+    onsets = notes // chord_size
+    
+    # (tick, order, message) per track; note_off sorts before note_on at the same tick
+    events = [[] for _ in range(tracks)]
+    tick = 0
+    note_index = 0
+    for i in range(orphaned_notes):
+        events[0].append((0, 1, mido.Message('note_on', channel=1, note=49 + i % 32, velocity=100)))
+    for _ in range(onsets):
+        for note in rng.sample(range(49, 81), chord_size):
+            duration = max(1, int(rng.uniform(min_beats, max_beats) * ticks_per_beat))
+            track_events = events[note_index % tracks]
+            track_events.append((tick, 1, mido.Message('note_on', note=note, velocity=100)))
+            track_events.append((tick + duration, 0, mido.Message('note_off', note=note, velocity=0)))
+            note_index += 1
+        tick += max(1, int(rng.uniform(min_beats, max_beats) * ticks_per_beat))
+    
+    # Tempo changes between 60 and 200 BPM, evenly spaced over the piece
+    for i in range(tempo_changes):
+        bpm = rng.uniform(60, 200)
+        events[0].append((tick * i // tempo_changes, 0, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm))))
+    
+    midi = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+    for track_events in events:
+        track = mido.MidiTrack()
+        previous = 0
+        for event_tick, _, msg in sorted(track_events, key=lambda event: (event[0], event[1])):
+            track.append(msg.copy(time=event_tick - previous))
+            previous = event_tick
+        midi.tracks.append(track)
+    midi.save(filename)
+    return filename
+
 if __name__ == "__main__":
     create_test_midi()
\ No newline at end of file
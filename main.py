@@ -1,23 +1,83 @@
+import time
+IMPORT_STARTED = time.perf_counter()
+
 import pygame
 import mido
-import cv2
+import argparse
 import numpy as np
-from moviepy.editor import ImageSequenceClip
-from collections import deque
-import time
+import os
+import stat
+import sys
+import math
+import shutil
+import subprocess
+import tempfile
+import multiprocessing
+import glob
+import json
+import hashlib
+import traceback
+import threading
+import queue
+import tracemalloc
+import contextlib
+import functools
+from collections import OrderedDict
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# cv2 is only needed by the OpenCV video backend and is imported there
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+class FrozenSlots:
+    """Base for layout objects that are read-only once __init__ has run.
+    
+    Attributes are assigned through _set, which also makes NumPy arrays
+    read-only, so one instance can be shared by concurrent renders.
+    """
+    __slots__ = ()
+
+    def _set(self, **attributes):
+        for name, value in attributes.items():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class SaxophoneKey(FrozenSlots):
+    __slots__ = ('name', 'position', 'size')
 
-class SaxophoneKey:
     def __init__(self, name, position, size=10):
-        self.name = name
-        self.position = position  # (x, y) coordinates
-        self.size = size
-        self.pressed = False
+        self._set(name=name, position=position, size=size)  # position is (x, y)
 
+    def __reduce__(self):
+        return SaxophoneKey, (self.name, self.position, self.size)
 
-class SaxophoneFingering:
-    def __init__(self):
+    def moved(self, dx, dy=0):
+        """The same key dx, dy pixels away"""
+        return SaxophoneKey(self.name, (self.position[0] + dx, self.position[1] + dy), self.size)
+
+
+class SaxophoneFingering(FrozenSlots):
+    """Key geometry and fingering table, compiled to arrays indexed by note and key.
+    
+    Instances are immutable and keep no per-frame state: the keys a chart
+    shows as pressed are passed to draw_fingering_chart. key_offset moves
+    every key right by that many pixels from its base position.
+    """
+    __slots__ = ('key_offset', 'keys', 'fingerings', 'key_lanes', 'key_order', 'key_index',
+                 'lane_y', 'lane_size', 'fingering_masks', 'note_keys')
+
+    def __init__(self, key_offset=0):
         # Keep your existing key definitions...
-        self.keys = {
+        keys = {
             # Octave key
             'Oct': SaxophoneKey('Oct', (60, 20), 5),
             
@@ -55,8 +115,12 @@ class SaxophoneFingering:
             'Low_C': SaxophoneKey('_C', (20, 640), 5),    
         }
         
+        # Keys are always placed from their base positions, so offsets never accumulate
+        if key_offset:
+            keys = {key_name: key.moved(key_offset) for key_name, key in keys.items()}
+        
         # Define fingering combinations for each note
-        self.fingerings = {
+        fingerings = {
             # Low register
             49: ['L1', 'L2', 'L3', 'R1', 'R2', 'R3', 'Low_Bb'],  # A#/Bb
             50: ['L1', 'L2', 'L3', 'R1', 'R2', 'R3', 'Low_B', 'C_side'],  # B
@@ -94,35 +158,71 @@ class SaxophoneFingering:
         }
         
         # Create individual lanes for each key
-        self.key_lanes = {}
-        for key_name, key in self.keys.items():
-            self.key_lanes[key_name] = {
+        key_lanes = {}
+        for key_name, key in keys.items():
+            key_lanes[key_name] = MappingProxyType({
                 'y': key.position[1] + 40, 
                 # 'x': key.position[0],       
                 'x': 20,
                 'size': key.size,           
-                'keys': [key_name]        
-            }
+                'keys': (key_name,)
+            })
+        
+        self._set(key_offset=key_offset, keys=MappingProxyType(keys),
+                  fingerings=MappingProxyType({note: tuple(fingering) for note, fingering in fingerings.items()}),
+                  key_lanes=MappingProxyType(key_lanes))
+        self._set(**self._compile_fingerings())
 
+    def __reduce__(self):
+        # Unpickles to the process's shared instance instead of a copy
+        return shared_fingering, (self.key_offset,)
 
-    def draw_fingering_chart(self, surface, note_number):
-        """Draw the complete fingering chart with pressed keys highlighted"""
-        # Reset all keys
-        for key in self.keys.values():
-            key.pressed = False
-        
-        # Get the fingering for the current note
-        fingering = self.fingerings.get(note_number, [])
+    def _compile_fingerings(self):
+        """Compile the fingering table into arrays indexed by note and key, for __init__ to set.
         
-        # Mark the required keys as pressed
-        for key_name in fingering:
-            if key_name in self.keys:
-                self.keys[key_name].pressed = True
+        Every key gets a fixed bit (key_index); fingering_masks[note] is a
+        uint32 with the bits of the keys pressed for that MIDI note, and
+        note_keys[note] lists the same key indices as a tuple.
+        """
+        key_order = tuple(self.key_lanes)
+        key_index = {key_name: index for index, key_name in enumerate(key_order)}
+        lane_y = np.array([self.key_lanes[key_name]['y'] for key_name in key_order], dtype=np.float64)
+        lane_size = np.array([self.key_lanes[key_name]['size'] for key_name in key_order], dtype=np.float64)
         
+        fingering_masks = np.zeros(128, dtype=np.uint32)
+        for note_number, fingering in self.fingerings.items():
+            for key_name in fingering:
+                if key_name in key_index:
+                    fingering_masks[note_number] |= np.uint32(1 << key_index[key_name])
+        bits = np.arange(len(key_order))
+        note_keys = tuple(tuple(np.flatnonzero((int(mask) >> bits) & 1).tolist()) for mask in fingering_masks)
+        return dict(key_order=key_order, key_index=MappingProxyType(key_index), lane_y=lane_y, lane_size=lane_size,
+                    fingering_masks=fingering_masks, note_keys=note_keys)
+
+    def mask_keys(self, mask):
+        """Key indices set in a fingering mask"""
+        return np.flatnonzero((int(mask) >> np.arange(len(self.key_order))) & 1)
+
+    def occupancy(self, note_numbers):
+        """Boolean (notes x keys) matrix of the keys pressed for each note"""
+        masks = self.fingering_masks[np.asarray(note_numbers, dtype=np.intp)]
+        return ((masks[:, None] >> np.arange(len(self.key_order), dtype=np.uint32)) & 1).astype(bool)
+
+    def lane_colors(self, key_colors, default=(150, 150, 150)):
+        """(keys x 3) uint8 array of lane colors in key_index order"""
+        return np.array([key_colors.get(key_name, default) for key_name in self.key_order], dtype=np.uint8)
+
+
+    def pressed_keys(self, note_number):
+        """Names of the keys pressed for a note (none for a rest)"""
+        return frozenset(self.fingerings.get(note_number, ()))
+
+    def draw_fingering_chart(self, surface, pressed):
+        """Draw the complete fingering chart with the keys named in `pressed` highlighted"""
         # Draw all keys
-        for key in self.keys.values():
+        for key_name, key in self.keys.items():
             # Draw key circle
-            if key.pressed:
+            if key_name in pressed:
                 color = (255, 255, 255, 255)  # White with full opacity for pressed keys
                 border_color = (255, 255, 255, 255)  # White border for pressed keys
             else:
@@ -147,18 +247,1055 @@ class SaxophoneFingering:
     pass
 
 
+@functools.lru_cache(maxsize=None)
+def shared_fingering(key_offset=0):
+    """The process-wide SaxophoneFingering for a key offset"""
+    return SaxophoneFingering(key_offset)
+
+
+class NotePairer:
+    """Pair note_on/note_off messages in a single pass over the events.
+    
+    Open notes are kept per (channel, note), so every event is handled in
+    constant time. Running status is already expanded by mido when the file
+    is read, and a note_on with velocity 0 counts as a note_off.
+    """
+    def __init__(self):
+        self.open_notes = {}  # (channel, note) -> (start, velocity, track)
+        self.notes = []  # (start, end, note, velocity, channel, track)
+        self.retriggered = 0
+        self.orphaned = 0
+        self.unmatched_offs = 0
+
+    def feed(self, time, msg, track=0):
+        """Handle one message at the given absolute time"""
+        if msg.type == 'note_on' and msg.velocity > 0:
+            key = (msg.channel, msg.note)
+            opened = self.open_notes.get(key)
+            if opened is not None:
+                # Re-triggered before release: the sounding note ends here
+                self._close(key, opened, time)
+                self.retriggered += 1
+            self.open_notes[key] = (time, msg.velocity, track)
+        elif msg.type in ('note_off', 'note_on'):
+            key = (msg.channel, msg.note)
+            opened = self.open_notes.pop(key, None)
+            if opened is None:
+                self.unmatched_offs += 1
+            else:
+                self._close(key, opened, time)
+
+    def finish(self, time):
+        """Close every note that never got a note_off"""
+        for key, opened in self.open_notes.items():
+            self._close(key, opened, time)
+            self.orphaned += 1
+        self.open_notes.clear()
+
+    def _close(self, key, opened, time):
+        start, velocity, track = opened
+        # Zero-length notes have nothing to draw
+        if time > start:
+            self.notes.append((start, time, key[1], velocity, key[0], track))
+
+
+class TempoMap:
+    """Piecewise-linear mapping from MIDI ticks to seconds.
+    
+    Built from every set_tempo event in every track. Each segment starts at a
+    tempo change and holds the seconds elapsed up to that point, so any
+    number of ticks converts with one searchsorted.
+    """
+    def __init__(self, ticks_per_beat, tempo_events):
+        self.ticks_per_beat = ticks_per_beat
+        
+        # Later events at the same tick win; the default tempo applies until the first change
+        changes = {0: 500000}
+        for tick, tempo in sorted(tempo_events, key=lambda event: event[0]):
+            changes[tick] = tempo
+        
+        self.ticks = np.array(sorted(changes), dtype=np.int64)
+        self.tempos = np.array([changes[tick] for tick in self.ticks], dtype=np.float64)
+        
+        # Seconds at the start of each segment
+        seconds_per_tick = self.tempos / (1000000 * ticks_per_beat)
+        self.seconds = np.concatenate(([0.0], np.cumsum(np.diff(self.ticks) * seconds_per_tick[:-1])))
+        self.seconds_per_tick = seconds_per_tick
+
+    @classmethod
+    def from_midi(cls, midi):
+        """Collect tempo events from all tracks of a mido.MidiFile"""
+        tempo_events = []
+        for track in midi.tracks:
+            absolute_time = 0
+            for msg in track:
+                absolute_time += msg.time
+                if msg.type == 'set_tempo':
+                    tempo_events.append((absolute_time, msg.tempo))
+        return cls(midi.ticks_per_beat, tempo_events)
+
+    def to_seconds(self, ticks):
+        """Convert an array of absolute ticks to seconds"""
+        ticks = np.asarray(ticks)
+        segment = np.searchsorted(self.ticks, ticks, side='right') - 1
+        return self.seconds[segment] + (ticks - self.ticks[segment]) * self.seconds_per_tick[segment]
+
+
+class BarIndex:
+    """Start time of every bar, from the time signatures and the tempo map.
+    
+    Bars run back to back at the length of the time signature in effect;
+    a time signature that falls inside a bar starts a new bar there.
+    Finding the bar at a time is one searchsorted.
+    """
+    def __init__(self, tempo_map, time_signatures, end_tick):
+        changes = {0: (4, 4)}
+        for tick, numerator, denominator in sorted(time_signatures):
+            changes[tick] = (numerator, denominator)
+        segment_ticks = sorted(changes) + [max(end_tick, 0) + 1]
+        
+        bars = []
+        for first, last in zip(segment_ticks[:-1], segment_ticks[1:]):
+            numerator, denominator = changes[first]
+            bar_length = max(tempo_map.ticks_per_beat * 4 * numerator // denominator, 1)
+            bars.append(np.arange(first, last, bar_length, dtype=np.int64))
+        self.ticks = np.concatenate(bars)
+        self.seconds = tempo_map.to_seconds(self.ticks)
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def bar_at(self, seconds):
+        """Index of the bar playing at a time, -1 before the first bar"""
+        return int(np.searchsorted(self.seconds, seconds, side='right')) - 1
+
+
+class PlaybackClock:
+    """Playback position that runs with the wall clock and can be paused and moved.
+    
+    Only an anchor (position, wall time) is stored, so seeking anywhere
+    costs the same. The clock starts paused.
+    """
+    def __init__(self, position=0.0):
+        self.anchor_position = position
+        self.anchor_time = time.perf_counter()
+        self.paused = True
+
+    def position(self):
+        if self.paused:
+            return self.anchor_position
+        return self.anchor_position + time.perf_counter() - self.anchor_time
+
+    def seek(self, position):
+        self.anchor_position = position
+        self.anchor_time = time.perf_counter()
+
+    def set_paused(self, paused):
+        position = self.position()
+        self.paused = paused
+        self.seek(position)
+
+
+def insert_rows(buffer, size, at, rows):
+    """Insert `rows` into buffer[:size] before positions `at` (as np.insert, `at` sorted).
+    
+    Only the rows from the first insertion point on are moved. The buffer is
+    replaced by one twice the size when it is full; the buffer holding the
+    rows is returned.
+    """
+    count = size + len(rows)
+    if len(buffer) < count:
+        grown = np.zeros(max(2 * count, 64), dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    first = int(at[0]) if len(at) else size
+    buffer[first:count] = np.insert(buffer[first:size], at - first, rows)
+    return buffer
+
+
+class IntervalTier:
+    """Rows of an IntervalIndex no longer than max_length, in start order.
+    
+    Columns live in one buffer with spare capacity, so rows added near the
+    end of the piece are inserted without copying the tier.
+    """
+    dtype = np.dtype([('row', np.int64), ('start', np.float64), ('end', np.float64)])
+
+    def __init__(self, rows, starts, ends, max_length):
+        self.buffer = np.zeros(len(rows), dtype=self.dtype)
+        self.buffer['row'] = rows
+        self.buffer['start'] = starts
+        self.buffer['end'] = ends
+        self.size = len(rows)
+        self.max_length = max_length
+
+    @property
+    def data(self):
+        return self.buffer[:self.size]
+
+    def insert(self, row, start, end):
+        record = np.array([(row, start, end)], dtype=self.dtype)
+        at = np.searchsorted(self.data['row'], [row])
+        self.buffer = insert_rows(self.buffer, self.size, at, record)
+        self.size += 1
+
+
+class IntervalIndex:
+    """Binary-search index over intervals sorted by their start.
+    
+    Rows are split into tiers by length. No interval in a tier is longer
+    than the tier's max_length, so the first row that can still overlap a
+    query starts after left - max_length and is found with searchsorted;
+    only the rows between the two bounds are checked one by one. A tier
+    takes the rows left over by the tiers before it that are at most twice
+    as long as their tier_fraction quantile, so a few long notes (an
+    orphaned note-on lasting to the end of its track) only widen the scan
+    of their own small tier.
+    """
+    tier_fraction = 0.99
+    min_tier_rows = 64
+
+    def __init__(self, starts, ends):
+        self.tiers = []
+        rows = np.arange(len(starts))
+        lengths = ends - starts
+        while len(rows):
+            if len(rows) > self.min_tier_rows:
+                inside = lengths[rows] <= 2 * np.quantile(lengths[rows], self.tier_fraction)
+            else:
+                inside = np.ones(len(rows), dtype=bool)
+            tier_rows = rows[inside]
+            self.tiers.append(IntervalTier(tier_rows, starts[tier_rows], ends[tier_rows],
+                                           self.pad(lengths[tier_rows].max())))
+            rows = rows[~inside]
+
+    @staticmethod
+    def pad(max_length):
+        # Widen the bound past float rounding in end - start; extra rows are filtered by their end
+        return float(max_length) * (1 + 1e-9) + 1e-9
+
+    def insert(self, at, starts, ends):
+        """Add intervals inserted into the table before rows `at` (as np.insert, `at` sorted).
+        
+        Only the rows from the first insertion point on are renumbered. An
+        interval longer than every tier widens the last tier while it is
+        small, and otherwise opens a new tier at least twice as long.
+        """
+        first = int(at[0])
+        for tier in self.tiers:
+            rows = tier.data['row']
+            moved = int(np.searchsorted(rows, first, side='left'))
+            rows[moved:] += np.searchsorted(at, rows[moved:], side='right')
+        
+        for row, start, end in zip((at + np.arange(len(at))).tolist(), starts.tolist(), ends.tolist()):
+            length = end - start
+            tier = next((tier for tier in self.tiers if length <= tier.max_length), None)
+            if tier is None:
+                if self.tiers and self.tiers[-1].size <= self.min_tier_rows:
+                    tier = self.tiers[-1]
+                    tier.max_length = self.pad(length)
+                else:
+                    longest = self.tiers[-1].max_length if self.tiers else 0.0
+                    tier = IntervalTier([], [], [], self.pad(max(length, 2 * longest)))
+                    self.tiers.append(tier)
+            tier.insert(row, start, end)
+
+    def query(self, left, right):
+        """Indices of the intervals overlapping [left, right], in start order"""
+        found = []
+        for tier in self.tiers:
+            data = tier.data
+            starts = data['start']
+            lo = int(np.searchsorted(starts, left - tier.max_length, side='left'))
+            hi = int(np.searchsorted(starts, right, side='right'))
+            hits = data['row'][lo:hi][data['end'][lo:hi] > left]
+            if len(hits) or not found:
+                found.append(hits)
+        if len(found) == 1:
+            return found[0]
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        # Rows from several tiers interleave; row order is start order
+        return np.sort(np.concatenate(found))
+
+
+class NoteTable:
+    """Columnar note store sorted by start time.
+    
+    Each note is one row of a structured array; columns are read as NumPy
+    views (table.start, table.note, ...) and the rows in a time or pixel
+    range come from its interval indexes, so renderers never need per-note
+    objects.
+    """
+    dtype = np.dtype([
+        ('start_tick', np.int64),
+        ('end_tick', np.int64),
+        ('start', np.float64),    # seconds
+        ('end', np.float64),      # seconds
+        ('x', np.float64),        # timeline position in pixels
+        ('length', np.float64),   # pixels
+        ('note', np.uint8),
+        ('velocity', np.uint8),
+        ('channel', np.uint8),
+        ('track', np.uint16),
+    ], align=True)  # padded rows keep column views aligned; unaligned ones are copied by searchsorted
+
+    def __init__(self, data=None):
+        if data is None:
+            data = np.zeros(0, dtype=self.dtype)
+        self.data = data
+        self._buffer = data  # grown by append(); rows past len(data) are spare
+        self._time_index = None
+        self._pixel_index = None
+
+    @classmethod
+    def from_columns(cls, **columns):
+        """Build a table from equal-length column arrays, sorted by start"""
+        size = len(next(iter(columns.values()))) if columns else 0
+        data = np.zeros(size, dtype=cls.dtype)
+        for name, values in columns.items():
+            data[name] = values
+        order = np.argsort(data['start'], kind='stable')
+        return cls(data[order])
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        """Rows as a new table; slices are views, masks and index arrays copy"""
+        return NoteTable(self.data[index])
+
+    @property
+    def start(self):
+        return self.data['start']
+
+    @property
+    def end(self):
+        return self.data['end']
+
+    @property
+    def x(self):
+        return self.data['x']
+
+    @property
+    def length(self):
+        return self.data['length']
+
+    @property
+    def note(self):
+        return self.data['note']
+
+    @property
+    def velocity(self):
+        return self.data['velocity']
+
+    @property
+    def channel(self):
+        return self.data['channel']
+
+    @property
+    def track(self):
+        return self.data['track']
+
+    def append(self, other):
+        """Add the rows of a table sorted by start, keeping this one sorted.
+        
+        Rows live in a buffer with spare capacity. Notes closed in a live
+        stream nearly all start after the stored ones, so only the few rows
+        after the first insertion point move, and the interval indexes built
+        so far are updated in place instead of being rebuilt.
+        """
+        if not len(other):
+            return
+        size = len(self.data)
+        at = np.searchsorted(self.data['start'], other.data['start'], side='right')
+        self._buffer = insert_rows(self._buffer, size, at, other.data)
+        self.data = self._buffer[:size + len(other)]
+        if self._time_index is not None:
+            self._time_index.insert(at, other.start, other.end)
+        if self._pixel_index is not None:
+            self._pixel_index.insert(at, other.x, other.x + other.length)
+
+    @property
+    def time_index(self):
+        """IntervalIndex over [start, end) in seconds"""
+        if self._time_index is None:
+            self._time_index = IntervalIndex(self.data['start'], self.data['end'])
+        return self._time_index
+
+    @property
+    def pixel_index(self):
+        """IntervalIndex over [x, x + length) in timeline pixels"""
+        if self._pixel_index is None:
+            self._pixel_index = IntervalIndex(self.data['x'], self.data['x'] + self.data['length'])
+        return self._pixel_index
+
+
+# ffmpeg rawvideo formats whose bytes can be read straight out of a surface
+RAW_PIXEL_FORMATS = {'rgb24', 'bgr24', 'rgba', 'bgra', 'argb', 'abgr', 'rgb0', 'bgr0', '0rgb', '0bgr'}
+
+
+def surface_pixel_format(surface):
+    """ffmpeg name of the surface's byte layout, or None if it has no rawvideo equivalent.
+    
+    A 32-bit surface with masks (0xff0000, 0xff00, 0xff, 0) is stored as
+    B, G, R, padding on a little-endian machine, which ffmpeg calls bgr0.
+    """
+    bytesize = surface.get_bytesize()
+    if bytesize not in (3, 4) or surface.get_pitch() != surface.get_width() * bytesize:
+        return None
+    layout = ['0'] * bytesize
+    for channel, mask, shift in zip('rgba', surface.get_masks(), surface.get_shifts()):
+        if not mask:
+            continue
+        if mask != 0xff << shift or shift % 8:
+            return None
+        byte = shift // 8 if sys.byteorder == 'little' else bytesize - 1 - shift // 8
+        layout[byte] = channel
+    name = ''.join(layout) + ('24' if bytesize == 3 else '')
+    return name if name in RAW_PIXEL_FORMATS else None
+
+
+class FFmpegVideoSink:
+    """Stream raw frames into an ffmpeg process as they are rendered.
+    
+    With input_pix_fmt set to the surface's own layout (surface_pixel_format)
+    each frame is written straight from the surface's pixel memory; without
+    it frames are converted to RGB bytes first.
+    """
+    def __init__(self, filename, size, fps, codec='libx264', crf=18, pix_fmt='yuv420p', input_pix_fmt=None,
+                 preset=None):
+        self.filename = filename
+        self.size = size
+        self.input_pix_fmt = input_pix_fmt
+        command = [
+            shutil.which('ffmpeg') or 'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', input_pix_fmt or 'rgb24',
+            '-s', f'{size[0]}x{size[1]}', '-r', str(fps),
+            '-i', '-',
+            '-an', '-c:v', codec, '-pix_fmt', pix_fmt,
+        ]
+        if crf is not None:
+            command += ['-crf', str(crf)]
+        if preset is not None:
+            command += ['-preset', preset]
+        command.append(filename)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, surface):
+        if self.input_pix_fmt is None:
+            self.process.stdin.write(pygame.image.tobytes(surface, 'RGB'))
+        else:
+            # Frames are larger than the pipe buffer, so this goes to the fd without a copy
+            self.process.stdin.write(surface.get_view('0'))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed while writing {self.filename}")
+
+
+class OpenCVVideoSink:
+    """Stream frames into cv2.VideoWriter; used when ffmpeg is not installed.
+    
+    Frames are converted to BGR into one preallocated buffer, reading the
+    surface's pixels in place when input_pix_fmt names their layout.
+    """
+    def __init__(self, filename, size, fps, codec='mp4v', input_pix_fmt=None):
+        import cv2
+        self.cv2 = cv2
+        self.filename = filename
+        self.size = size
+        self.writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"Could not open {filename} for writing with codec {codec}")
+        
+        conversions = {
+            'bgr24': None, 'rgb24': cv2.COLOR_RGB2BGR,
+            'bgr0': cv2.COLOR_BGRA2BGR, 'bgra': cv2.COLOR_BGRA2BGR,
+            'rgb0': cv2.COLOR_RGBA2BGR, 'rgba': cv2.COLOR_RGBA2BGR,
+        }
+        if input_pix_fmt not in conversions:
+            input_pix_fmt = None
+        self.input_pix_fmt = input_pix_fmt
+        self.conversion = conversions[input_pix_fmt or 'rgb24']
+        self.channels = 3 if input_pix_fmt in (None, 'rgb24', 'bgr24') else 4
+        self.frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
+    def write(self, surface):
+        if self.input_pix_fmt is None:
+            pixels = pygame.image.tobytes(surface, 'RGB')
+        else:
+            pixels = surface.get_view('0')
+        pixels = np.frombuffer(pixels, dtype=np.uint8).reshape(self.size[1], self.size[0], self.channels)
+        if self.conversion is None:
+            self.writer.write(pixels)
+        else:
+            self.writer.write(self.cv2.cvtColor(pixels, self.conversion, dst=self.frame))
+
+    def close(self):
+        self.writer.release()
+
+
+def open_video_sink(filename, size, fps, codec=None, crf=18, pix_fmt='yuv420p', backend='auto',
+                    input_pix_fmt=None, preset=None):
+    """Open an encoder that accepts one frame at a time.
+    
+    The ffmpeg backend takes any ffmpeg codec, CRF, pixel format and
+    encoder preset. The OpenCV backend takes a fourcc code and ignores
+    crf, pix_fmt and preset.
+    input_pix_fmt is the byte layout of the surfaces that will be written,
+    from surface_pixel_format; None means any surface, converted per frame.
+    """
+    if backend == 'auto':
+        backend = 'ffmpeg' if shutil.which('ffmpeg') else 'opencv'
+    if backend == 'ffmpeg':
+        return FFmpegVideoSink(filename, size, fps, codec or 'libx264', crf, pix_fmt, input_pix_fmt, preset)
+    if backend == 'opencv':
+        return OpenCVVideoSink(filename, size, fps, codec or 'mp4v', input_pix_fmt)
+    raise ValueError(f"Unknown video backend: {backend}")
+
+
+class BackgroundVideoSink:
+    """Encode frames on a background thread while the next ones are rendered.
+    
+    Frames live in a fixed pool of surfaces with the same format as
+    `template`. write() copies the rendered frame into a free one, waiting
+    while all of them are queued (the backpressure), and the encoder thread
+    writes it to `sink` and returns it to the pool.
+    
+    The renderer keeps drawing into one surface rather than into the pool:
+    SDL re-encodes the RLE tiles and chart atlas whenever their blit
+    destination changes, which costs far more than the copy.
+    """
+    def __init__(self, sink, template, buffers=4):
+        self.sink = sink
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(template.copy())
+        self.filled = queue.Queue()
+        self.error = None
+        self.frames = 0
+        self.wait_seconds = 0.0
+        self.encode_seconds = 0.0
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.drain, name='video-encoder', daemon=True)
+        self.thread.start()
+
+    def _acquire(self):
+        """A free pooled surface, waiting for the encoder if there is none"""
+        if self.error is not None:
+            raise self.error
+        started = time.perf_counter()
+        surface = self.free.get()
+        self.wait_seconds += time.perf_counter() - started
+        return surface
+
+    def write(self, surface):
+        buffer = self._acquire()
+        buffer.blit(surface, (0, 0))
+        self.frames += 1
+        self.filled.put(buffer)
+
+    def drain(self):
+        while True:
+            surface = self.filled.get()
+            if surface is None:
+                return
+            # After a failure keep recycling buffers so the renderer never blocks forever
+            if self.error is None:
+                started = time.perf_counter()
+                try:
+                    self.sink.write(surface)
+                except Exception as e:
+                    self.error = e
+                self.encode_seconds += time.perf_counter() - started
+            self.free.put(surface)
+
+    def close(self):
+        render_seconds = time.perf_counter() - self.started - self.wait_seconds
+        self.filled.put(None)
+        self.thread.join()
+        if self.error is not None:
+            # Closing a sink that failed mid-stream (a dead ffmpeg) raises a less
+            # useful error of its own, so the encoder's error is the one raised
+            try:
+                raise self.error
+            finally:
+                with contextlib.suppress(Exception):
+                    self.sink.close()
+        self.sink.close()
+        if self.frames:
+            print(f"Rendered {self.frames} frames at {self.frames / max(render_seconds, 1e-9):.1f} fps, "
+                  f"encoded at {self.frames / max(self.encode_seconds, 1e-9):.1f} fps "
+                  f"({self.wait_seconds:.1f} s waiting for free buffers)")
+
+
+class MidiStream:
+    """Raw MIDI bytes read from stdin, a FIFO or a growing file as they arrive.
+    
+    A background thread reads whatever bytes are available, decodes them
+    (with running status) and queues each channel message with the
+    perf_counter time its bytes were read. A regular file is followed like
+    `tail -f`; stdin and FIFOs end when the writer closes them.
+    
+    Only raw MIDI bytes are understood. A Standard MIDI File (which starts
+    with MThd) would decode its delta times as note data, so the stream
+    stops and drain() raises ValueError instead.
+    """
+    def __init__(self, source, poll_interval=0.01):
+        self.source = source
+        self.poll_interval = poll_interval
+        self.events = queue.Queue()
+        self.closed = False
+        self.error = None
+        self.header = b''  # first bytes read, to recognise a Standard MIDI File
+        self.status = None
+        self.data = []
+        self.thread = threading.Thread(target=self.read, name='midi-stream', daemon=True)
+        self.thread.start()
+
+    def read(self):
+        if self.source == '-':
+            fd = sys.stdin.buffer.fileno()
+        else:
+            fd = os.open(self.source, os.O_RDONLY)
+        # Only a file opened by path is followed; stdin redirected from a file ends at its end
+        follow = self.source != '-' and stat.S_ISREG(os.fstat(fd).st_mode)
+        try:
+            while True:
+                data = os.read(fd, 4096)
+                arrived = time.perf_counter()
+                if not data:
+                    if not follow:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                if len(self.header) < 4:
+                    # Header bytes are all below 0x80, so decoding never emits anything for them
+                    self.header += data[:4 - len(self.header)]
+                    if self.header == b'MThd':
+                        name = 'stdin' if self.source == '-' else self.source
+                        self.error = ValueError(f"{name} is a Standard MIDI File; --stream only reads raw MIDI "
+                                                f"bytes, so play the file without --stream")
+                        return
+                for msg in self.decode(data):
+                    self.events.put((arrived, msg))
+        finally:
+            if self.source != '-':
+                os.close(fd)
+            self.closed = True
+
+    def decode(self, data):
+        """Channel messages completed by these bytes; everything else is skipped"""
+        for byte in data:
+            if byte >= 0xF8:
+                continue  # Real-time bytes may appear anywhere
+            if byte >= 0xF0:
+                # System messages cancel running status; their data bytes are ignored
+                self.status = None
+                self.data = []
+            elif byte >= 0x80:
+                self.status = byte
+                self.data = []
+            elif self.status is not None:
+                self.data.append(byte)
+                if len(self.data) == (1 if 0xC0 <= self.status < 0xE0 else 2):
+                    yield mido.Message.from_bytes([self.status] + self.data)
+                    self.data = []
+
+    def drain(self):
+        """Every (arrival time, message) received since the last call"""
+        if self.error is not None:
+            raise self.error
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+
+class NoteTileCache:
+    """Note layer of the whole piece, pre-rendered into fixed-width tiles.
+    
+    Tiles cover the timeline in pixels (NoteTable.x) and are drawn on first
+    use. Only the max_tiles most recently used tiles are kept, so memory
+    stays bounded however long the piece is. Each frame is then one or two
+    blits at the current scroll offset.
+    """
+    def __init__(self, notes, draw_notes, height, tile_width=2048, max_tiles=6):
+        self.notes = notes
+        self.draw_notes = draw_notes
+        self.height = height
+        self.tile_width = tile_width
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+
+    def get_tile(self, index):
+        """Surface for tile `index`, least recently used tiles evicted first"""
+        tile = self.tiles.get(index)
+        if tile is not None:
+            self.tiles.move_to_end(index)
+            return tile
+        
+        tile = self.render_tile(index)
+        self.tiles[index] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def invalidate(self, left, right):
+        """Drop the tiles that overlap timeline pixels [left, right)"""
+        for index in range(int(left // self.tile_width), int(right // self.tile_width) + 1):
+            self.tiles.pop(index, None)
+
+    def render_tile(self, index):
+        left = index * self.tile_width
+        right = left + self.tile_width
+        
+        # Black is never a note color, so it serves as the transparent color key
+        tile = pygame.Surface((self.tile_width, self.height))
+        tile.fill((0, 0, 0))
+        
+        indices = self.notes.pixel_index.query(left, right)
+        self.draw_notes(tile, self.notes.x[indices] - left, self.notes.length[indices], self.notes.note[indices])
+        
+        tile.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+        return tile
+
+    def blit(self, surface, scroll, top=0):
+        """Draw the part of the timeline that starts `scroll` pixels in onto surface, `top` pixels down"""
+        scroll = math.floor(scroll)
+        width = surface.get_width()
+        first_tile = max(scroll, 0) // self.tile_width
+        last_tile = max(scroll + width - 1, 0) // self.tile_width
+        for index in range(first_tile, last_tile + 1):
+            surface.blit(self.get_tile(index), (index * self.tile_width - scroll, top))
+
+
+class NoteCache:
+    """Content-addressed on-disk cache of parsed and laid-out notes.
+    
+    Entries are keyed by the MIDI file's SHA-256, the layout parameters and
+    the format version, and hold the note table and tempo map as .npy files,
+    which warm starts map into memory read-only instead of parsing the MIDI
+    file. The least recently used entries are deleted once the cache grows
+    past max_bytes.
+    """
+    # Part of every key; bump it whenever NoteTable.dtype or the entry layout changes
+    format_version = 2
+    # Every entry's meta.json has these; store() writes them
+    meta_keys = ('notes', 'ticks_per_beat', 'total_duration', 'time_signatures')
+
+    def __init__(self, directory=None, max_bytes=512 * 1024 * 1024):
+        self.directory = directory or os.path.join(os.path.expanduser('~'), '.cache', 'saxophonehero')
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, midi_file, layout):
+        """Cache key for a MIDI file's contents laid out with `layout`"""
+        fields = {'format': self.format_version, 'file': file_hash(midi_file), 'layout': layout}
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def load(self, key):
+        """(notes, tempo_map, meta) for a key, or None on a miss.
+        
+        A damaged entry (unreadable files, or meta without one of
+        meta_keys) counts as a miss and is deleted, so the next store can
+        write it again.
+        """
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, 'meta.json')) as file:
+                meta = json.load(file)
+            missing = [name for name in self.meta_keys if name not in meta]
+            if missing:
+                raise KeyError(missing[0])
+            tempo = np.load(os.path.join(entry, 'tempo.npy'))
+            tempo_map = TempoMap(meta['ticks_per_beat'], zip(tempo['tick'].tolist(), tempo['tempo'].tolist()))
+            if meta['notes']:
+                notes = NoteTable(np.load(os.path.join(entry, 'notes.npy'), mmap_mode='r'))
+            else:
+                notes = NoteTable()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+        
+        # Touch the entry so eviction sees it as recently used
+        os.utime(entry)
+        return notes, tempo_map, meta
+
+    def store(self, key, notes, tempo_map, meta):
+        """Write an entry, then evict old entries beyond the size cap"""
+        entry = os.path.join(self.directory, key)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix='.staging-')
+        try:
+            tempo = np.zeros(len(tempo_map.ticks), dtype=[('tick', np.int64), ('tempo', np.float64)])
+            tempo['tick'] = tempo_map.ticks
+            tempo['tempo'] = tempo_map.tempos
+            np.save(os.path.join(staging, 'tempo.npy'), tempo)
+            np.save(os.path.join(staging, 'notes.npy'), notes.data)
+            with open(os.path.join(staging, 'meta.json'), 'w') as file:
+                json.dump(dict(meta, notes=len(notes)), file)
+            os.replace(staging, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class Profiler:
+    """Opt-in timing spans for pipeline stages and per-frame draw phases.
+    
+    Spans are recorded as Chrome trace events (chrome://tracing, Perfetto).
+    When disabled, span() hands back one shared no-op context manager, so
+    instrumented code costs a method call and nothing else. With
+    track_memory, each span also records the peak traced Python memory
+    while it was open.
+    """
+    NULL_SPAN = contextlib.nullcontext()
+
+    def __init__(self, enabled=False, track_memory=False):
+        self.enabled = enabled
+        self.track_memory = track_memory and enabled
+        self.events = []
+        self.stack = []
+        self.origin = time.perf_counter_ns()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def span(self, name, category='frame'):
+        if not self.enabled:
+            return self.NULL_SPAN
+        return _ProfilerSpan(self, name, category)
+
+    def export(self, filename):
+        """Write the recorded spans as Chrome trace-event JSON"""
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, file)
+        print(f"Trace with {len(self.events)} events written to {filename}")
+
+
+class _ProfilerSpan:
+    def __init__(self, profiler, name, category):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.peak = 0
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.track_memory:
+            # Hand the peak so far to the enclosing span before resetting it
+            if profiler.stack:
+                parent = profiler.stack[-1]
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        profiler.stack.append(self)
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        ended = time.perf_counter_ns()
+        profiler = self.profiler
+        profiler.stack.pop()
+        event = {
+            'name': self.name, 'cat': self.category, 'ph': 'X',
+            'ts': (self.started - profiler.origin) / 1000, 'dur': (ended - self.started) / 1000,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+        }
+        if profiler.track_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            event['args'] = {'peak_bytes': self.peak}
+            if profiler.stack:
+                parent = profiler.stack[-1]
+                parent.peak = max(parent.peak, self.peak)
+        profiler.events.append(event)
+        return False
+
+
+class LaneGeometry(FrozenSlots):
+    """Note block geometry and color of every lane, in key_index order.
+    
+    A layout scaled by `scale` and moved down by `offset` pixels gives the
+    lanes of one band in ensemble mode; scale 1 and offset 0 is the full
+    window. Immutable, like the fingering it is built from.
+    """
+    __slots__ = ('top', 'note_height', 'radius', 'colors', 'color_tuples')
+
+    def __init__(self, top, note_height, radius, colors):
+        self._set(top=top, note_height=note_height, radius=radius, colors=colors,
+                  color_tuples=tuple(tuple(color) for color in colors.tolist()))
+
+    def __reduce__(self):
+        return LaneGeometry, (self.top, self.note_height, self.radius, self.colors)
+
+    @classmethod
+    def from_fingering(cls, fingering, min_lane_height, key_colors, scale=1.0, offset=0):
+        lane_height = np.maximum(min_lane_height, fingering.lane_size * 2.5) * scale
+        note_height = lane_height * 0.8
+        top = (offset + fingering.lane_y * scale - note_height / 2).astype(int)
+        radius = np.minimum(note_height / 2, 10 * scale).astype(int)
+        return cls(top, np.maximum(note_height.astype(int), 1), radius, fingering.lane_colors(key_colors))
+
+
+class EnsemblePart:
+    """One part of an ensemble: its notes, its band of the window and its lanes.
+    
+    `lanes` places the blocks on screen; the part's tiles are only as tall
+    as the band, so they are drawn with `tile_lanes`, the same lanes
+    relative to the top of the band.
+    """
+    def __init__(self, name, notes, top, height, scale, lanes, tile_lanes):
+        self.name = name
+        self.notes = notes
+        self.top = top
+        self.height = height
+        self.scale = scale
+        self.lanes = lanes
+        self.tile_lanes = tile_lanes
+        self.tiles = None
+        self.rasterizer = None
+        self.current_note = None
+
+
+class NumpyNoteRasterizer:
+    """Export backend that writes note blocks straight into the frame's pixels.
+    
+    All visible (note, key) blocks are expanded to per-row spans in one
+    vectorized pass, turned into per-row coverage with a difference array
+    and a cumulative sum, and filled lane by lane through a pixels2d view.
+    Rounded corners come from a per-row inset mask measured from
+    pygame.draw.rect itself, so the output matches the pygame backend.
+    """
+    def __init__(self, occupancy, lane_top, lane_height, lane_radius, lane_colors, width, height):
+        self.occupancy = occupancy
+        self.lane_top = lane_top
+        self.lane_height = lane_height
+        self.lane_colors = lane_colors
+        self.width = width
+        
+        # Rows of each lane that fall on a surface `height` pixels tall; a lane
+        # below the bottom edge (a window shorter than the layout) gets none
+        self.visible_rows = np.stack((np.clip(-lane_top, 0, lane_height),
+                                      np.clip(height - lane_top, 0, lane_height)), axis=1).astype(np.int64)
+        
+        # Every lane row gets a row number in the coverage buffer
+        self.row_start = np.concatenate(([0], np.cumsum(lane_height)[:-1]))
+        self.coverage = np.zeros((int(lane_height.sum()), width + 1), dtype=np.int16)
+        
+        # Narrow blocks get a smaller radius from pygame, so insets are measured per width
+        self.max_measured_width = int(4 * lane_radius.max() + 8)
+        insets = [self.corner_insets(height, radius, self.max_measured_width)
+                  for height, radius in zip(lane_height.tolist(), lane_radius.tolist())]
+        self.left_insets = np.concatenate([left for left, _ in insets])
+        self.right_insets = np.concatenate([right for _, right in insets])
+
+    @staticmethod
+    def corner_insets(height, radius, max_width):
+        """Pixels left out at the start and end of every row of a rounded block.
+        
+        Returns two (height x max_width + 1) arrays indexed by row and block
+        width; blocks wider than max_width share the last column.
+        """
+        left = np.zeros((height, max_width + 1), dtype=np.int64)
+        right = np.zeros((height, max_width + 1), dtype=np.int64)
+        block = pygame.Surface((max_width, height))
+        for width in range(1, max_width + 1):
+            block.fill((0, 0, 0))
+            pygame.draw.rect(block, (255, 255, 255), (0, 0, width, height), border_radius=radius)
+            filled = pygame.surfarray.array_red(block)[:width] > 0
+            for row in range(height):
+                columns = np.flatnonzero(filled[:, row])
+                if len(columns):
+                    left[row, width] = columns[0]
+                    right[row, width] = width - 1 - columns[-1]
+                else:
+                    left[row, width] = width
+        return left, right
+
+    def draw(self, surface, left, width, note_numbers):
+        """Fill the blocks of notes whose on-screen spans are [left, left + width)"""
+        rows, keys = np.nonzero(self.occupancy(note_numbers))
+        if not len(rows):
+            return
+        
+        # One entry per pixel row of every block
+        heights = self.lane_height[keys]
+        block = np.repeat(np.arange(len(keys)), heights)
+        row_in_block = np.arange(len(block)) - np.repeat(np.cumsum(heights) - heights, heights)
+        lane_row = self.row_start[keys][block] + row_in_block
+        block_left = left[rows][block]
+        block_width = width[rows][block]
+        measured = np.minimum(block_width, self.max_measured_width)
+        starts = np.clip(block_left + self.left_insets[lane_row, measured], 0, self.width)
+        ends = np.clip(block_left + block_width - self.right_insets[lane_row, measured], 0, self.width)
+        drawn = ends > starts
+        
+        # +1 where a span starts and -1 where it ends, counted over the flat buffer
+        coverage = self.coverage
+        stride = coverage.shape[1]
+        lane_row = lane_row[drawn] * stride
+        coverage.ravel()[:] = np.bincount(lane_row + starts[drawn], minlength=coverage.size)
+        coverage.ravel()[:] -= np.bincount(lane_row + ends[drawn], minlength=coverage.size)
+        
+        pixels = pygame.surfarray.pixels2d(surface)
+        for key in np.unique(keys).tolist():
+            first, last = self.visible_rows[key].tolist()
+            if last <= first:
+                continue
+            top = self.lane_top[key]
+            row = self.row_start[key]
+            lane = coverage[row + first:row + last]
+            np.cumsum(lane, axis=1, out=lane)
+            pixels[:, top + first:top + last][lane[:, :self.width].T > 0] = surface.map_rgb(self.lane_colors[key])
+        del pixels
+
+
 class SaxophoneVisualizer:
-    def __init__(self, midi_file, window_size=(1600, 900), scroll_speed=2):
+    def __init__(self, midi_file, window_size=(1600, 900), scroll_speed=2, headless=False, fps=60,
+                 dirty_updates=False, cache_dir=None, profile_startup=False, profiler=None, hud=False,
+                 raster='pygame', stream=False, parts=None):
+        self.profiler = profiler or Profiler()
+        self.hud = hud
+        # Seconds spent in each startup stage, up to the first rendered frame
+        self.profile_startup = profile_startup
+        self.startup_times = {'imports': IMPORT_SECONDS}
+        self.startup_mark = time.perf_counter()
+        self.time_to_first_frame = None
+        
         # Keep existing initialization code...
         self.tempo = 500000  # Default tempo (microseconds per beat)
         self.ticks_per_beat = None
         self.scroll_speed = scroll_speed
-        self.pixels_per_beat = 60  # This defines how many pixels represent one beat
+        # Target refresh rate; scrolling speed does not depend on it
+        self.fps = fps
+        # Notes scroll by scroll_speed pixels every 1/60 s
+        self.pixels_per_second = scroll_speed * 60
         
         # Window and display settings
         self.window_size = window_size
         self.note_height = 30
-        self.active_notes = deque()
         self.midi_file = midi_file
         
         # Add missing attributes for lanes and visualization
@@ -196,188 +1333,443 @@ class SaxophoneVisualizer:
         self.chart_width = 200
         self.chart_x = 100
         self.note_start_x = self.playline_x
+        # Time for a note to scroll from the right edge to the playline
+        self.lead_in = (window_size[0] - self.playline_x) / self.pixels_per_second
+        
+        # Headless mode draws onto an off-screen surface and needs no display
+        self.headless = headless
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
         
         pygame.init()
         pygame.font.init()
-        self.screen = pygame.display.set_mode(window_size)
-        pygame.display.set_caption("Saxophone MIDI Visualizer")
+        if headless:
+            self.screen = pygame.Surface(window_size)
+        else:
+            self.screen = pygame.display.set_mode(window_size)
+            pygame.display.set_caption("Saxophone MIDI Visualizer")
+        self.mark_startup('pygame_init')
         
-        self.chart_surface = pygame.Surface((300, 900), pygame.SRCALPHA)
-        self.fingering_system = SaxophoneFingering()
+        self.chart_font = pygame.font.Font(None, 36)
+        self.chart_atlas = {}  # (note, chart_x, scale) -> chart surface
+        self.label_font = pygame.font.Font(None, 16)
+        self.static_layer = None
+        self.static_layer_layout = None
+        self.fingering_system = shared_fingering()
         self.current_note = None
-        self.current_chart = None
         self.last_active_note = None
+        self.visible_count = 0
         
-        self.midi_data = self.process_midi_file()
+        self.note_cache = NoteCache(cache_dir) if cache_dir else None
+        # A live stream starts with no notes; run() adds them as they arrive
+        self.stream = MidiStream(midi_file) if stream else None
+        self.notes = self.open_stream() if stream else self.load_notes()
+        end_tick = int(self.notes.data['end_tick'].max()) if len(self.notes) else 0
+        self.bars = BarIndex(self.tempo_map, self.time_signatures, end_tick)
+        # Playback starts one lead-in before the first beat, wherever the window was opened
+        self.playback = PlaybackClock(-self.lead_in)
+        self.mark_startup('load_notes')
         self.adjust_key_positions()
+        self.bake_chart_atlas()
+        self.compile_lane_geometry()
+        self.note_tiles = NoteTileCache(self.notes, self.draw_notes, window_size[1])
         
-    def process_midi_file(self):
-        """Process MIDI file and calculate note lengths based on tempo"""
-        midi = mido.MidiFile(self.midi_file)
-        self.ticks_per_beat = midi.ticks_per_beat
-        note_events = []
+        # The NumPy rasterizer replaces the tiles for video export
+        self.raster = raster
+        self.note_rasterizer = None
+        if raster == 'numpy':
+            self.note_rasterizer = self.make_rasterizer(self.lanes)
         
-        # Initialize tempo (microseconds per beat)
-        tempo = 500000  # Default: 120 BPM (60000000 / 500000 = 120)
+        # Ensemble mode splits the notes into parts by track or channel, one band each
+        self.parts = parts
+        self.ensemble = self.split_parts(parts) if parts else None
+        self.mark_startup('layout')
         
-        # Read tempo from MIDI if available
-        for msg in midi.tracks[0]:
-            if msg.type == 'set_tempo':
-                tempo = msg.tempo
-                break
+        # Dirty-rectangle presentation for the interactive window
+        self.dirty_updates = dirty_updates
+        self.full_redraw = True
+        self.dirty_lanes = set()
+        self.lane_rect_cache = self.lane_rects()
+        
+    def mark_startup(self, stage):
+        """Record the time since the previous startup stage ended"""
+        now = time.perf_counter()
+        self.startup_times[stage] = now - self.startup_mark
+        self.startup_mark = now
+
+    def print_startup_profile(self):
+        for stage, seconds in self.startup_times.items():
+            print(f"  {stage:<12} {seconds * 1000:8.1f} ms")
+        print(f"  {'to first frame':<12} {self.time_to_first_frame * 1000:8.1f} ms (from first import)")
+
+    def layout_params(self):
+        """Parameters the note geometry depends on, part of the cache key"""
+        return {
+            'pixels_per_second': self.pixels_per_second,
+            'scroll_speed': self.scroll_speed,
+            'window_size': list(self.window_size),
+        }
+
+    def load_notes(self):
+        """Note table from the on-disk cache, parsing the MIDI file on a miss"""
+        if self.note_cache is None:
+            return self.process_midi_file()
+        
+        key = self.note_cache.key(self.midi_file, self.layout_params())
+        cached = self.note_cache.load(key)
+        if cached is not None:
+            notes, self.tempo_map, meta = cached
+            self.time_signatures = [tuple(signature) for signature in meta['time_signatures']]
+            self.ticks_per_beat = meta['ticks_per_beat']
+            self.tempo = int(self.tempo_map.tempos[0])
+            self.total_duration = meta['total_duration']
+            print(f"Notes: {len(notes)} (cached)")
+            return notes
+        
+        notes = self.process_midi_file()
+        self.note_cache.store(key, notes, self.tempo_map, {
+            'ticks_per_beat': self.ticks_per_beat,
+            'total_duration': self.total_duration,
+            'time_signatures': self.time_signatures,
+        })
+        return notes
+
+    def process_midi_file(self, midi=None):
+        """Process MIDI file and calculate note lengths based on tempo"""
+        if midi is None:
+            with self.profiler.span('parse', 'stage'):
+                midi = mido.MidiFile(self.midi_file)
+        
+        with self.profiler.span('layout', 'stage'):
+            return self.layout_notes(midi)
+
+    def layout_notes(self, midi):
+        """Pair the notes of a parsed file and lay them out on the timeline"""
+        self.ticks_per_beat = midi.ticks_per_beat
+        self.tempo_map = TempoMap.from_midi(midi)
+        self.tempo = int(self.tempo_map.tempos[0])
         
         # Calculate timing conversion factors
-        microseconds_per_beat = tempo
+        microseconds_per_beat = self.tempo
         seconds_per_beat = microseconds_per_beat / 1000000
         beats_per_second = 1 / seconds_per_beat
         beats_per_minute = beats_per_second * 60
         
-        print(f"Tempo: {beats_per_minute} BPM")
+        print(f"Tempo: {beats_per_minute} BPM ({len(self.tempo_map.ticks) - 1} tempo changes)")
         print(f"Seconds per beat: {seconds_per_beat}")
         
         # Process notes
-        current_time = 0
-        initial_x = self.window_size[0] + 200
+        pairer = NotePairer()
         
-        for track in midi.tracks:
+        self.time_signatures = []
+        for track_index, track in enumerate(midi.tracks):
             absolute_time = 0
             for msg in track:
                 absolute_time += msg.time
-                
-                if msg.type == 'note_on' and msg.velocity > 0:
-                    note_start = absolute_time
-                    # Find corresponding note_off event
-                    note_end = None
-                    next_time = absolute_time
-                    for next_msg in track[track.index(msg) + 1:]:
-                        next_time += next_msg.time
-                        if (next_msg.type in ['note_off', 'note_on'] and 
-                            next_msg.note == msg.note and 
-                            (next_msg.type == 'note_off' or next_msg.velocity == 0)):
-                            note_end = next_time
-                            break
-                    
-                    if note_end is not None:
-                        # Calculate note duration in beats
-                        duration_ticks = note_end - note_start
-                        duration_beats = duration_ticks / self.ticks_per_beat
-                        
-                        # Convert duration to pixels
-                        note_length_pixels = duration_beats * self.pixels_per_beat
-                        
-                        note_events.append({
-                            'time': note_start,
-                            'note': msg.note,
-                            'velocity': msg.velocity,
-                            'x': initial_x + (note_start / self.ticks_per_beat * self.pixels_per_beat),
-                            'length': note_length_pixels,
-                            'duration_beats': duration_beats
-                        })
-                        
-                        print(f"Note {msg.note}: duration = {duration_beats} beats, length = {note_length_pixels} pixels")
-        
-        note_events.sort(key=lambda x: x['time'])
-        
-        if note_events:
-            max_time = max(event['time'] for event in note_events)
-            self.total_duration = (max_time / self.ticks_per_beat) * self.pixels_per_beat / self.scroll_speed
-        else:
+                pairer.feed(absolute_time, msg, track_index)
+                if msg.type == 'time_signature':
+                    self.time_signatures.append((absolute_time, msg.numerator, msg.denominator))
+            # Notes still sounding at the end of the track are closed there
+            pairer.finish(absolute_time)
+        
+        print(f"Notes: {len(pairer.notes)} from {len(midi.tracks)} tracks "
+              f"({pairer.retriggered} re-triggered, {pairer.orphaned} orphaned, "
+              f"{pairer.unmatched_offs} unmatched note_off)")
+        
+        if not pairer.notes:
             self.total_duration = 0
+            return NoteTable()
+        
+        notes = self.build_note_table(pairer.notes)
+        self.total_duration = float(notes.end.max())
+        
+        return notes
+
+    def build_note_table(self, pairs):
+        """Note table from NotePairer tuples, timed with self.tempo_map"""
+        columns = np.array(pairs, dtype=np.int64)
+        start_tick, end_tick = columns[:, 0], columns[:, 1]
+        
+        # Convert every start and end to seconds in one pass over the tempo map
+        start = self.tempo_map.to_seconds(start_tick)
+        end = self.tempo_map.to_seconds(end_tick)
+        
+        return NoteTable.from_columns(
+            start_tick=start_tick,
+            end_tick=end_tick,
+            start=start,
+            end=end,
+            x=start * self.pixels_per_second,
+            length=(end - start) * self.pixels_per_second,
+            note=columns[:, 2],
+            velocity=columns[:, 3],
+            channel=columns[:, 4],
+            track=columns[:, 5],
+        )
+
+    def open_stream(self):
+        """Empty note table for a live stream, timed at the default tempo"""
+        self.ticks_per_beat = 480
+        self.tempo_map = TempoMap(self.ticks_per_beat, [])
+        self.tempo = int(self.tempo_map.tempos[0])
+        self.time_signatures = []
+        self.total_duration = 0
+        self.stream_pairer = NotePairer()
+        self.stream_origin = time.perf_counter()
+        self.stream_arrivals = []  # arrival times of note events not yet on screen
+        self.stream_latencies = []  # seconds from arrival to the frame that showed them
+        print(f"Streaming MIDI from {'stdin' if self.midi_file == '-' else self.midi_file}")
+        return NoteTable()
+
+    def stream_ticks(self, arrived):
+        """Ticks since the stream started for a perf_counter time"""
+        seconds = max(arrived - self.stream_origin, 0.0)
+        return round(seconds * self.ticks_per_beat * 1000000 / self.tempo)
+
+    def stream_finished(self):
+        return self.stream.closed and self.stream.events.empty() and not self.stream_pairer.open_notes
+
+    def ingest_stream(self):
+        """Pair the messages that arrived since the last frame and add the notes that closed.
+        
+        Closed notes are appended to the note table in start order, which
+        updates its indexes in place, and only the tiles the new notes
+        overlap are redrawn.
+        """
+        for arrived, msg in self.stream.drain():
+            self.stream_pairer.feed(self.stream_ticks(arrived), msg)
+            if msg.type in ('note_on', 'note_off'):
+                self.stream_arrivals.append(arrived)
+        if self.stream.closed and self.stream.events.empty() and self.stream_pairer.open_notes:
+            self.stream_pairer.finish(self.stream_ticks(time.perf_counter()))
+        if not self.stream_pairer.notes:
+            return
+        
+        notes = self.build_note_table(self.stream_pairer.notes)
+        self.stream_pairer.notes.clear()
+        self.notes.append(notes)
+        self.note_tiles.invalidate(notes.x.min(), (notes.x + notes.length).max())
+        self.total_duration = max(self.total_duration, float(notes.end.max()))
+
+    def held_notes(self, current_time):
+        """Screen x, length and note number of the notes still held in a live stream.
         
-        return note_events
+        A held note reaches from its start to the right edge, where the
+        stream's present is drawn.
+        """
+        held = self.stream_pairer.open_notes
+        start = self.tempo_map.to_seconds(np.array([opened[0] for opened in held.values()], dtype=np.int64))
+        note = np.array([key[1] for key in held], dtype=np.uint8)
+        x = self.playline_x + (start - current_time) * self.pixels_per_second
+        length = np.maximum(current_time + self.lead_in - start, 0) * self.pixels_per_second
+        return x, length, note
+
+    def print_stream_latency(self):
+        """Arrival-to-screen latency; events are drained every frame, so it should stay within two frames"""
+        if not self.stream_latencies:
+            return
+        latencies = np.array(self.stream_latencies) * 1000
+        bound = 2000 / self.fps
+        print(f"Stream latency over {len(latencies)} note events: mean {latencies.mean():.1f} ms, "
+              f"p99 {np.percentile(latencies, 99):.1f} ms, max {latencies.max():.1f} ms "
+              f"({int((latencies > bound).sum())} over {bound:.1f} ms)")
 
     def adjust_key_positions(self):
-        """Adjust key positions to fit within the chart area"""
-        for key in self.fingering_system.keys.values():
-            # Keep original y position, adjust x position to be relative to chart_x
-            new_x = key.position[0] + self.chart_x
-            key.position = (new_x, key.position[1])
+        """Adjust key positions to fit within the chart area.
+        
+        Keys keep their y position and move to chart_x from their base
+        positions, so calling this again does not shift them further.
+        """
+        self.fingering_system = shared_fingering(self.chart_x)
 
-    def draw_fingering_chart(self, note_number):
-        """Draw saxophone fingering chart for given note"""
-        if self.current_note != note_number:
-            self.chart_surface.fill((0, 0, 0, 0))  # Clear with transparency
-            
-            # Draw the diagram
-            self.fingering_system.draw_fingering_chart(self.chart_surface, note_number)
-            
-            # Add note name above the chart
-            font = pygame.font.Font(None, 36)  # Increased font size
+    def build_chart(self, note_number):
+        """Render the fingering chart and note name for one note (None for a rest)"""
+        chart = pygame.Surface((300, 900), pygame.SRCALPHA)
+        
+        # Draw the diagram
+        self.fingering_system.draw_fingering_chart(chart, self.fingering_system.pressed_keys(note_number))
+        
+        # Add note name above the chart
+        if note_number is not None:
             note_name = self.fingering_system.get_note_name(note_number)
-            text = font.render(note_name, True, (255, 255, 255))
+            text = self.chart_font.render(note_name, True, (255, 255, 255))
             text_rect = text.get_rect(centerx=150, y=800)  # Adjusted position
-            self.chart_surface.blit(text, text_rect)
-            
-            self.current_note = note_number
-            self.current_chart = self.chart_surface.copy()
+            chart.blit(text, text_rect)
+        
+        return chart
+
+    def bake_chart_atlas(self):
+        """Render the charts for every supported note and the rest chart up front"""
+        for note_number in [None, *self.fingering_system.fingerings]:
+            self.get_chart(note_number)
+
+    def get_chart(self, note_number, scale=1.0):
+        """Chart surface for a note from the atlas, rendered on first use.
+        
+        Scaled charts for ensemble bands are resampled from the full-size one.
+        """
+        key = (note_number, self.chart_x, scale)
+        chart = self.chart_atlas.get(key)
+        if chart is None:
+            if scale == 1.0:
+                chart = self.build_chart(note_number)
+            else:
+                full = self.get_chart(note_number)
+                chart = pygame.transform.smoothscale(full, (round(full.get_width() * scale),
+                                                            round(full.get_height() * scale)))
+            self.chart_atlas[key] = chart
+        return chart
+
+    def draw_fingering_chart(self, note_number):
+        """Draw saxophone fingering chart for given note"""
+        self.current_note = note_number
         
         # Draw chart at the specified position
-        self.screen.blit(self.current_chart, (0, 40))
+        self.screen.blit(self.get_chart(note_number), (0, 40))
+        
+    def compile_lane_geometry(self):
+        """Note block geometry and color for every lane of the full-window layout"""
+        self.lanes = self.lane_geometry()
+
+    def lane_geometry(self, scale=1.0, offset=0):
+        return LaneGeometry.from_fingering(self.fingering_system, self.min_lane_height, self.key_colors,
+                                           scale, offset)
+
+    def make_rasterizer(self, lanes):
+        return NumpyNoteRasterizer(self.fingering_system.occupancy, lanes.top, lanes.note_height,
+                                   lanes.radius, lanes.colors, self.window_size[0], self.window_size[1])
+
+    def split_parts(self, by):
+        """One EnsemblePart per track or channel that has notes, stacked top to bottom.
+        
+        Every band shows the single-part layout scaled to its height (the
+        layout is designed for a 900 pixel window), so all parts share one
+        band background and one set of scaled charts.
+        """
+        column = self.notes.track if by == 'track' else self.notes.channel
+        values = np.unique(column).tolist() or [0]
+        height = self.window_size[1] // len(values)
+        scale = height / 900
+        parts = []
+        for index, value in enumerate(values):
+            name = f"Track {value}" if by == 'track' else f"Channel {value + 1}"
+            top = index * height
+            part = EnsemblePart(name, self.notes[column == value], top, height, scale,
+                                self.lane_geometry(scale, top), self.lane_geometry(scale))
+            part.tiles = NoteTileCache(part.notes, functools.partial(self.draw_notes, lanes=part.tile_lanes),
+                                       height)
+            if self.raster == 'numpy':
+                part.rasterizer = self.make_rasterizer(part.lanes)
+            parts.append(part)
         
-    def draw_note(self, note):
-            """Draw note blocks in individual lanes with correct lengths"""
-            fingering = self.fingering_system.fingerings.get(note['note'], [])
-            note_end_x = note['x'] + note['length']
+        for note_number in [None, *self.fingering_system.fingerings]:
+            self.get_chart(note_number, scale)
+        print(f"Ensemble: {len(parts)} parts by {by}, {height} px each")
+        return parts
+
+    def draw_notes(self, surface, x, lengths, note_numbers, lanes=None):
+            """Draw the note blocks of many notes in their lanes.
             
-            # Only draw if note is at least partially visible
-            if note_end_x > 0:  # Changed from self.playline_x - 10
-                for key_name in fingering:
-                    if key_name in self.fingering_system.key_lanes:
-                        lane_info = self.fingering_system.key_lanes[key_name]
-                        color = self.key_colors.get(key_name, (150, 150, 150))
-                        
-                        # Calculate note dimensions
-                        lane_height = max(self.min_lane_height, lane_info['size'] * 2.5)
-                        note_height = lane_height * 0.8
-                        y_pos = lane_info['y'] - note_height/2
-                        
-                        # Calculate correct x positions
-                        x_start = max(note['x'], 0)  # Don't start before left edge
-                        note_width = min(note_end_x, self.window_size[0]) - x_start  # Don't extend past right edge
-                        
-                        if note_width > 0:
-                            note_rect = pygame.Rect(x_start, y_pos, note_width, note_height)
-                            radius = min(note_height / 2, 10)
-                            
-                            # Draw note with better visibility
-                            pygame.draw.rect(self.screen, color, note_rect, border_radius=int(radius))
-                            
-                            # Highlight note if it's at the playline
-                            if self.playline_x - 2 <= note['x'] <= self.playline_x + 2:
-                                pygame.draw.rect(self.screen, (255, 255, 255), note_rect,
-                                            width=2, border_radius=int(radius))    
+            The keys of all notes come out of one occupancy lookup; only the
+            rectangles themselves are drawn one by one.
+            """
+            lanes = lanes or self.lanes
+            rows, keys = np.nonzero(self.fingering_system.occupancy(note_numbers))
+            left = np.floor(x[rows]).astype(int)
+            width = np.floor(x[rows] + lengths[rows]).astype(int) - left
+            tops = lanes.top[keys]
+            heights = lanes.note_height[keys]
+            radii = lanes.radius[keys]
+            for key, note_left, note_width, top, height, radius in zip(
+                    keys.tolist(), left.tolist(), width.tolist(), tops.tolist(), heights.tolist(), radii.tolist()):
+                # Draw note with better visibility
+                pygame.draw.rect(surface, lanes.color_tuples[key], (note_left, top, note_width, height),
+                                 border_radius=radius)
+
+    def draw_note_highlight(self, note_number, x, length, lanes=None):
+            """Outline the blocks of a note that is at the playline"""
+            for key in self.fingering_system.note_keys[note_number]:
+                note_rect, radius = self.note_rect(key, x, length, lanes)
+                pygame.draw.rect(self.screen, (255, 255, 255), note_rect,
+                                 width=2, border_radius=radius)
+
+    def note_rect(self, key, x, length, lanes=None):
+            """Rectangle and corner radius of a note block in a key's lane"""
+            lanes = lanes or self.lanes
+            note_rect = pygame.Rect(math.floor(x), lanes.top[key],
+                                    math.floor(x + length) - math.floor(x), lanes.note_height[key])
+            return note_rect, int(lanes.radius[key])
     
-    def draw_lanes(self):
-        """Draw individual lanes for each key with transparency"""
+    def build_static_layer(self, height=None, scale=1.0):
+        """Render the background, lanes, separator and key labels once.
+        
+        The layer is opaque like the screen, so the lane colors come out
+        exactly as they did when they were drawn straight onto it. With a
+        height and scale it is the background of one ensemble band; key
+        labels too small to read are left out there.
+        """
+        height = height or self.window_size[1]
+        layer = pygame.Surface((self.window_size[0], height))
+        layer.fill((0, 0, 0))
+        
         # Draw background for lanes area with high transparency
         lane_area_rect = pygame.Rect(self.note_start_x, 0, 
                                    self.window_size[0] - self.note_start_x, 
-                                   self.window_size[1])
-        pygame.draw.rect(self.screen, (20, 20, 20, 30), lane_area_rect)
+                                   height)
+        pygame.draw.rect(layer, (20, 20, 20, 30), lane_area_rect)
         
         # Draw separator line between chart and lanes
-        pygame.draw.line(self.screen, (100, 100, 100),
+        pygame.draw.line(layer, (100, 100, 100),
                         (self.playline_x - 10, 0),
-                        (self.playline_x - 10, self.window_size[1]), 1)
+                        (self.playline_x - 10, height), 1)
+        
+        label_font = self.label_font if scale == 1.0 else None
+        if scale != 1.0 and 16 * scale >= 10:
+            label_font = pygame.font.Font(None, int(16 * scale))
         
         for key_name, lane_info in self.fingering_system.key_lanes.items():
-            lane_height = max(self.min_lane_height, lane_info['size'] * 2)
+            lane_height = int(max(self.min_lane_height, lane_info['size'] * 2) * scale)
+            lane_y = int(lane_info['y'] * scale)
             
             # Draw lane background
             lane_rect = pygame.Rect(self.note_start_x, 
-                                  lane_info['y'] - lane_height//2,
+                                  lane_y - lane_height//2,
                                   self.window_size[0] - self.note_start_x,
                                   lane_height)
-            pygame.draw.rect(self.screen, (30, 30, 30, 30), lane_rect)
+            pygame.draw.rect(layer, (30, 30, 30, 30), lane_rect)
             
             # Draw key name
-            font = pygame.font.Font(None, 16)
-            text = font.render(key_name.replace('_', ' '), True, (150, 150, 150))
-            text_rect = text.get_rect(
-                right=self.note_start_x - 5,
-                centery=lane_info['y']
-            )
-            self.screen.blit(text, text_rect)
+            if label_font is not None:
+                text = label_font.render(key_name.replace('_', ' '), True, (150, 150, 150))
+                text_rect = text.get_rect(
+                    right=self.note_start_x - 5,
+                    centery=lane_y
+                )
+                layer.blit(text, text_rect)
+        
+        return layer
+
+    def build_ensemble_layer(self):
+        """Static layer for ensemble mode: the shared band background once per part, with names and dividers"""
+        part = self.ensemble[0]
+        band = self.build_static_layer(part.height, part.scale)
+        layer = pygame.Surface(self.window_size)
+        layer.fill((0, 0, 0))
+        for part in self.ensemble:
+            layer.blit(band, (0, part.top))
+            if part.top:
+                pygame.draw.line(layer, (100, 100, 100), (0, part.top), (self.window_size[0], part.top), 1)
+            text = self.label_font.render(part.name, True, (200, 200, 200))
+            layer.blit(text, (5, part.top + 4))
+        return layer
+
+    def draw_lanes(self):
+        """Draw individual lanes for each key from the cached static layer"""
+        layout = (self.window_size, self.note_start_x, self.playline_x, self.min_lane_height)
+        if self.static_layer is None or self.static_layer_layout != layout:
+            self.static_layer = self.build_ensemble_layer() if self.ensemble else self.build_static_layer()
+            self.static_layer_layout = layout
+        self.screen.blit(self.static_layer, (0, 0))
     
     def draw_playline(self):
         """Draw the vertical playline"""
@@ -385,87 +1777,664 @@ class SaxophoneVisualizer:
                         (self.playline_x, 0),
                         (self.playline_x, self.window_size[1]), 2)
     
+    def end_time(self):
+        """Playback time at which the last note has scrolled off the left edge"""
+        return self.total_duration + self.playline_x / self.pixels_per_second
+
+    def frame_time(self, frame_index):
+        """Playback time of a frame; playback starts one lead-in before the first beat"""
+        return frame_index / self.fps - self.lead_in
+
+    def frame_count(self):
+        """Number of frames until the last note has scrolled off the left edge"""
+        if not len(self.notes):
+            return 0
+        return math.ceil((self.end_time() + self.lead_in) * self.fps)
+
+    def visible_notes(self, current_time, notes=None):
+        """Indices of the notes (of a part, with `notes`) on screen at a point in time"""
+        notes = self.notes if notes is None else notes
+        left = current_time - self.playline_x / self.pixels_per_second
+        return notes.time_index.query(left, current_time + self.lead_in)
+
+    def render_frame(self, current_time, clip_rects=None, visible=None, chart=None):
+        """Draw the frame for a point in playback time onto self.screen.
+        
+        Positions are a pure function of the time: a note is at
+        x = playline + (start - now) * pixels_per_second, so it reaches the
+        playline exactly when it sounds, whatever the frame rate.
+        
+        With clip_rects only those regions are redrawn. The visible notes
+        and chart note (passed in by render_dirty, or looked up here) and
+        the notes at the playline are found once; only the drawing is
+        repeated for each region.
+        """
+        profiler = self.profiler
+        clips = [None] if clip_rects is None else clip_rects
+        with profiler.span('draw_lanes'):
+            for rect in clips:
+                self.screen.set_clip(rect)
+                self.draw_lanes()
+        with profiler.span('draw_playline'):
+            for rect in clips:
+                self.screen.set_clip(rect)
+                self.draw_playline()
+        
+        scroll = current_time * self.pixels_per_second - self.playline_x
+        if self.ensemble:
+            # Ensemble frames are always redrawn whole, so there is a single clip
+            for rect in clips:
+                self.screen.set_clip(rect)
+                self.render_parts(current_time, scroll)
+        else:
+            if visible is None:
+                visible = self.visible_notes(current_time)
+            self.visible_count = len(visible)
+            held = None
+            if self.stream is not None and self.stream_pairer.open_notes:
+                held = self.held_notes(current_time)
+            with profiler.span('draw_notes'):
+                for rect in clips:
+                    self.screen.set_clip(rect)
+                    self.draw_note_layer(self.notes, visible, scroll, self.note_tiles, self.note_rasterizer)
+                    if held is not None:
+                        self.draw_notes(self.screen, *held)
+            with profiler.span('draw_highlights'):
+                highlights = self.playline_notes(self.notes, visible, scroll)
+                for rect in clips:
+                    self.screen.set_clip(rect)
+                    for note_number, x, length in highlights:
+                        self.draw_note_highlight(note_number, x, length)
+            with profiler.span('draw_fingering_chart'):
+                self.last_active_note = self.chart_note(current_time) if chart is None else chart
+                for rect in clips:
+                    self.screen.set_clip(rect)
+                    self.draw_fingering_chart(self.last_active_note)
+        self.screen.set_clip(None)
+        
+        if self.time_to_first_frame is None:
+            self.mark_startup('first_frame')
+            self.time_to_first_frame = time.perf_counter() - IMPORT_STARTED
+            if self.profile_startup:
+                print("Startup profile:")
+                self.print_startup_profile()
+
+    def render_parts(self, current_time, scroll):
+        """Draw every ensemble part into its band: notes, highlights and chart"""
+        profiler = self.profiler
+        self.visible_count = 0
+        for part in self.ensemble:
+            visible = self.visible_notes(current_time, part.notes)
+            self.visible_count += len(visible)
+            with profiler.span('draw_notes'):
+                self.draw_note_layer(part.notes, visible, scroll, part.tiles, part.rasterizer, part.top)
+            with profiler.span('draw_highlights'):
+                self.draw_highlights(part.notes, visible, scroll, part.lanes)
+            with profiler.span('draw_fingering_chart'):
+                part.current_note = self.chart_note(current_time, part.notes)
+                self.screen.blit(self.get_chart(part.current_note, part.scale),
+                                 (0, part.top + round(40 * part.scale)))
+
+    def draw_note_layer(self, notes, visible, scroll, tiles, rasterizer=None, top=0):
+        """Draw the visible note blocks from the tiles, or with the rasterizer when there is one"""
+        if rasterizer is not None:
+            # Same pixel snapping as draw_notes
+            x = notes.x[visible] - math.floor(scroll)
+            left = np.floor(x).astype(np.int64)
+            width = np.floor(x + notes.length[visible]).astype(np.int64) - left
+            rasterizer.draw(self.screen, left, width, notes.note[visible])
+        else:
+            tiles.blit(self.screen, scroll, top)
+
+    def playline_notes(self, notes, visible, scroll):
+        """(note number, x, length) of the visible notes that are at the playline"""
+        x = notes.x[visible] - scroll
+        return [(int(notes.note[index]), float(note_x), float(notes.length[index]))
+                for index, note_x in zip(visible, x)
+                if self.playline_x - 2 <= note_x <= self.playline_x + 2]
+
+    def draw_highlights(self, notes, visible, scroll, lanes=None):
+        """Highlight notes that are at the playline"""
+        for note_number, x, length in self.playline_notes(notes, visible, scroll):
+            self.draw_note_highlight(note_number, x, length, lanes)
+
+    def chart_note(self, current_time, notes=None):
+        """The latest note to reach the playline sets the fingering chart"""
+        notes = self.notes if notes is None else notes
+        playline_time = current_time + 2 / self.pixels_per_second
+        chart_index = int(np.searchsorted(notes.start, playline_time, side='right')) - 1
+        return int(notes.note[chart_index]) if chart_index >= 0 else None
+
+    def seek(self, position):
+        """Move playback to a time. Frames are a function of the time alone
+        (an IntervalIndex query and a searchsorted), so nothing is replayed."""
+        self.playback.seek(min(max(position, -self.lead_in), self.end_time()))
+
+    def seek_bar(self, bar):
+        """Move playback to the start of a bar, counted from 0"""
+        self.seek(float(self.bars.seconds[min(max(bar, 0), len(self.bars) - 1)]))
+
+    def jump_bars(self, count):
+        """Move playback by whole bars; going back from inside a bar first returns to its start"""
+        position = self.playback.position()
+        bar = self.bars.bar_at(position)
+        if count < 0 and bar >= 0 and position > self.bars.seconds[bar] + 0.1:
+            count += 1
+        self.seek_bar(bar + count)
+
+    def handle_key(self, event):
+        """Space pauses, Left/Right scrub by a second (five with Shift),
+        Up/Down or Page Up/Down jump by a bar, Home/End go to either end"""
+        position = self.playback.position()
+        step = 5 if event.mod & pygame.KMOD_SHIFT else 1
+        if event.key == pygame.K_SPACE:
+            self.playback.set_paused(not self.playback.paused)
+        elif event.key == pygame.K_LEFT:
+            self.seek(position - step)
+        elif event.key == pygame.K_RIGHT:
+            self.seek(position + step)
+        elif event.key in (pygame.K_UP, pygame.K_PAGEUP):
+            self.jump_bars(1)
+        elif event.key in (pygame.K_DOWN, pygame.K_PAGEDOWN):
+            self.jump_bars(-1)
+        elif event.key == pygame.K_HOME:
+            self.seek(-self.lead_in)
+        elif event.key == pygame.K_END:
+            self.seek(self.end_time())
+
+    def lane_rects(self):
+        """Full-width strip covering each lane's note blocks and their outlines"""
+        rects = []
+        for key in range(len(self.fingering_system.key_order)):
+            note_rect, _ = self.note_rect(key, 0, self.window_size[0])
+            rects.append(note_rect.inflate(0, 4))
+        return rects
+
+    def dirty_rects(self, current_time, visible=None, chart=None):
+        """Screen regions that can differ from the previous frame.
+        
+        Notes only ever move inside the lanes that have a note on screen now
+        or had one last frame; the chart area changes only with the note.
+        visible and chart are the frame's visible notes and chart note when
+        the caller already has them.
+        """
+        if self.full_redraw or self.ensemble:
+            self.full_redraw = False
+            self.dirty_lanes = set()
+            return [self.screen.get_rect()]
+        
+        if visible is None:
+            visible = self.visible_notes(current_time)
+        note_numbers = self.notes.note[visible]
+        if self.stream is not None and self.stream_pairer.open_notes:
+            note_numbers = np.concatenate((note_numbers, self.held_notes(current_time)[2]))
+        masks = self.fingering_system.fingering_masks[note_numbers]
+        lanes = set(self.fingering_system.mask_keys(np.bitwise_or.reduce(masks)).tolist()) if len(masks) else set()
+        
+        strips = sorted((self.lane_rect_cache[key] for key in lanes | self.dirty_lanes),
+                        key=lambda rect: rect.top)
+        self.dirty_lanes = lanes
+        
+        # Merge touching strips into bands to keep the number of rects small
+        rects = []
+        for strip in strips:
+            if rects and strip.top <= rects[-1].bottom:
+                rects[-1].union_ip(strip)
+            else:
+                rects.append(strip.copy())
+        
+        if (self.chart_note(current_time) if chart is None else chart) != self.current_note:
+            rects.append(pygame.Rect(0, 40, self.chart_x + 200, self.window_size[1] - 40))
+        return rects
+
+    def render_dirty(self, current_time):
+        """Redraw only the dirty regions of the frame and return them"""
+        if self.ensemble:
+            visible = chart = None
+        else:
+            visible = self.visible_notes(current_time)
+            chart = self.chart_note(current_time)
+        rects = self.dirty_rects(current_time, visible, chart)
+        self.render_frame(current_time, rects, visible, chart)
+        return rects
+
+    def render_offline(self, first_frame=0, last_frame=None):
+        """Yield self.screen once per rendered frame, as fast as possible.
+        
+        Time advances by exactly one frame period per frame, so the frames
+        match the interactive window; nothing waits on the clock. A frame
+        range renders one segment of the piece.
+        """
+        if last_frame is None:
+            last_frame = self.frame_count()
+        for frame_index in range(first_frame, last_frame):
+            with self.profiler.span('render', 'stage'):
+                self.render_frame(self.frame_time(frame_index))
+            yield self.screen
+
+    def draw_hud(self, frame_ms, dropped_frames):
+        """Draw frame time, visible-note count and dropped frames in the top right corner"""
+        lines = [f"{frame_ms:5.1f} ms/frame", f"{self.visible_count} notes visible", f"{dropped_frames} dropped"]
+        if self.stream is not None and self.stream_latencies:
+            lines.append(f"{self.stream_latencies[-1] * 1000:5.1f} ms input latency")
+        elif self.stream is None:
+            bar = max(self.bars.bar_at(self.playback.position()), 0)
+            lines.append(f"bar {bar + 1}/{len(self.bars)}" + (" paused" if self.playback.paused else ""))
+        rect = pygame.Rect(self.window_size[0] - 170, 5, 165, 16 * len(lines) + 8)
+        self.screen.fill((0, 0, 0), rect)
+        for row, line in enumerate(lines):
+            text = self.label_font.render(line, True, (255, 255, 0))
+            self.screen.blit(text, (rect.x + 6, rect.y + 4 + row * 16))
+        return rect
+
     def run(self):
-        """Modified run function with improved timing"""
-        current_time = 0
+        """Play in the window, positioned by a monotonic clock.
+        
+        Late frames do not slow the chart down: each frame shows where the
+        notes are at the time it is drawn. Playback can be paused and moved
+        with the keys in handle_key, except for a live stream.
+        """
         clock = pygame.time.Clock()
-        event_index = 0
+        profiler = self.profiler
+        end_time = self.end_time()
+        start = time.perf_counter()
+        if self.stream is not None:
+            # Stream time 0 reaches the right edge as playback starts
+            self.stream_origin = start - self.playback.position() - self.lead_in
+        # Holding an arrow key scrubs
+        pygame.key.set_repeat(300, 50)
+        self.playback.set_paused(False)
+        frame_started = start
+        frame_ms = 0.0
+        dropped_frames = 0
         running = True
         
         while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.full_redraw = True
+                elif event.type == pygame.KEYDOWN and self.stream is None:
+                    self.handle_key(event)
             
-            self.screen.fill((0, 0, 0))
-            self.draw_lanes()
-            self.draw_playline()
-            
-            # Process new notes
-            while (event_index < len(self.midi_data) and 
-                   self.midi_data[event_index]['time'] <= current_time * self.ticks_per_beat):
-                note_data = {
-                    'note': self.midi_data[event_index]['note'],
-                    'x': self.window_size[0],
-                    'length': self.midi_data[event_index]['length'],
-                    'start_time': current_time
-                }
-                self.active_notes.append(note_data)
-                event_index += 1
-            
-            # Update and draw active notes
-            notes_to_remove = []
-            for note in self.active_notes:
-                note['x'] -= self.scroll_speed
-                self.draw_note(note)
-                
-                # Check if note is at playline
-                if self.playline_x - 2 <= note['x'] <= self.playline_x + 2:
-                    self.draw_fingering_chart(note['note'])
-                    self.last_active_note = note
-                
-                # Remove notes that have passed
-                if note['x'] + note['length'] < 0:
-                    notes_to_remove.append(note)
+            current_time = self.playback.position()
+            if self.stream is not None:
+                with profiler.span('ingest_stream', 'stage'):
+                    self.ingest_stream()
+                end_time = self.end_time()
+            with profiler.span('render', 'stage'):
+                if self.dirty_updates:
+                    rects = self.render_dirty(current_time)
+                else:
+                    self.render_frame(current_time)
+                if self.hud:
+                    hud_rect = self.draw_hud(frame_ms, dropped_frames)
+            with profiler.span('display.flip'):
+                if self.dirty_updates:
+                    pygame.display.update(rects + [hud_rect] if self.hud else rects)
+                else:
+                    pygame.display.flip()
+            if self.stream is not None and self.stream_arrivals:
+                shown = time.perf_counter()
+                self.stream_latencies.extend(shown - arrived for arrived in self.stream_arrivals)
+                self.stream_arrivals.clear()
+            with profiler.span('clock.tick'):
+                clock.tick(self.fps)
             
-            # Remove passed notes
-            for note in notes_to_remove:
-                self.active_notes.remove(note)
-            
-            pygame.display.flip()
-            clock.tick(60)
-            current_time += 1/60
+            # A frame that took over one and a half periods means at least one was skipped
+            now = time.perf_counter()
+            frame_ms = (now - frame_started) * 1000
+            frame_started = now
+            if frame_ms > 1500 / self.fps:
+                dropped_frames += 1
             
             # Check if complete
-            if event_index >= len(self.midi_data) and not self.active_notes:
+            if current_time >= end_time and not self.playback.paused and \
+                    (self.stream is None or self.stream_finished()):
                 running = False
         
+        if self.stream is not None:
+            self.print_stream_latency()
         pygame.quit()
     
     def cleanup(self):
         """Clean up resources"""
         pygame.quit()
     
-    def save_video(self, filename, fps=60):
-        """Save recorded frames as video"""
-        if self.frames:
-            print(f"\nSaving video to {filename}...")
-            clip = ImageSequenceClip(self.frames, fps=fps)
-            clip.write_videofile(filename)
-            print("Video saved successfully!")
+    def save_video(self, filename, codec=None, crf=18, pix_fmt='yuv420p', backend='auto', jobs=1, buffers=4,
+                   preset=None):
+        """Render every frame offline and stream it to the encoder.
+        
+        With buffers > 0 frames are drawn into that many pooled surfaces and
+        encoded on a background thread; with 0 rendering and encoding take
+        turns on this thread.
+        """
+        if jobs > 1:
+            if backend != 'opencv' and shutil.which('ffmpeg'):
+                return self.save_video_parallel(filename, jobs, codec, crf, pix_fmt, buffers, preset)
+            print("Parallel rendering needs ffmpeg to join segments; rendering serially")
+        
+        print(f"\nSaving video to {filename}...")
+        sink = open_video_sink(filename, self.window_size, self.fps, codec, crf, pix_fmt, backend,
+                               surface_pixel_format(self.screen), preset)
+        if buffers > 0:
+            sink = BackgroundVideoSink(sink, self.screen, buffers)
+        try:
+            for frame in self.render_offline():
+                with self.profiler.span('encode', 'stage'):
+                    sink.write(frame)
+        finally:
+            sink.close()
+        print("Video saved successfully!")
+
+    def save_video_parallel(self, filename, jobs, codec=None, crf=18, pix_fmt='yuv420p', buffers=4, preset=None):
+        """Render the timeline in `jobs` segments on a process pool.
+        
+        Every frame depends only on its time, so each worker renders exactly
+        the frames a serial render would. The encoded segments are joined
+        with ffmpeg's concat demuxer without re-encoding.
+        """
+        frame_count = self.frame_count()
+        bounds = [frame_count * i // jobs for i in range(jobs + 1)]
+        cache_dir = self.note_cache.directory if self.note_cache else None
+        extension = os.path.splitext(filename)[1] or '.mp4'
+        print(f"\nSaving video to {filename} with {jobs} jobs...")
+        
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(filename))) as segment_dir:
+            segments = [os.path.join(segment_dir, f"segment_{i:04d}{extension}") for i in range(jobs)]
+            # Spawned workers start from a clean interpreter instead of a forked SDL state
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = [
+                    pool.submit(render_segment, self.midi_file, self.window_size, self.scroll_speed, self.fps,
+                                bounds[i], bounds[i + 1], segments[i], codec, crf, pix_fmt, cache_dir, self.raster,
+                                buffers, self.parts, preset)
+                    for i in range(jobs) if bounds[i] < bounds[i + 1]
+                ]
+                segments = [future.result() for future in futures]
+            
+            concat_list = os.path.join(segment_dir, "segments.txt")
+            with open(concat_list, 'w') as file:
+                for segment in segments:
+                    file.write(f"file '{segment}'\n")
+            subprocess.run([shutil.which('ffmpeg'), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', concat_list, '-c', 'copy', filename], check=True)
+        print("Video saved successfully!")
+
+
+def render_segment(midi_file, window_size, scroll_speed, fps, first_frame, last_frame, filename,
+                   codec=None, crf=18, pix_fmt='yuv420p', cache_dir=None, raster='pygame', buffers=4, parts=None,
+                   preset=None):
+    """Worker entry point: render and encode frames [first_frame, last_frame) to one file"""
+    visualizer = SaxophoneVisualizer(midi_file, window_size, scroll_speed, headless=True, fps=fps,
+                                     cache_dir=cache_dir, raster=raster, parts=parts)
+    sink = open_video_sink(filename, window_size, visualizer.fps, codec, crf, pix_fmt, 'ffmpeg',
+                           surface_pixel_format(visualizer.screen), preset)
+    if buffers > 0:
+        sink = BackgroundVideoSink(sink, visualizer.screen, buffers)
+    try:
+        for frame in visualizer.render_offline(first_frame, last_frame):
+            sink.write(frame)
+    finally:
+        sink.close()
+        visualizer.cleanup()
+    return filename
+
+
+def find_midi_files(pattern):
+    """MIDI files in a directory, or the files matching a glob pattern"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*')
+    return sorted(path for path in glob.glob(pattern)
+                  if os.path.isfile(path) and path.lower().endswith(('.mid', '.midi')))
+
+
+def batch_root(pattern):
+    """Directory batch outputs mirror: the directory itself, or the glob's path up to its first wildcard"""
+    if os.path.isdir(pattern):
+        return pattern
+    root = os.path.dirname(pattern)
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def convert_midi_file(midi_file, output, options):
+    """Batch worker: render one MIDI file to a video and report how it went.
+    
+    The video is written under a temporary name and moved into place only
+    once it is complete, so an interrupted run never leaves an output that
+    looks up to date.
+    """
+    report = {'input': midi_file, 'output': output, 'status': 'ok', 'error': None}
+    started = time.perf_counter()
+    partial = f"{os.path.splitext(output)[0]}.partial{os.path.splitext(output)[1]}"
+    try:
+        visualizer = SaxophoneVisualizer(midi_file, options['window_size'], scroll_speed=2, headless=True,
+                                         fps=options['fps'], cache_dir=options['cache_dir'],
+                                         raster=options['raster'], parts=options['parts'])
+        loaded = time.perf_counter()
+        report['load_seconds'] = loaded - started
+        report['notes'] = len(visualizer.notes)
+        report['frames'] = visualizer.frame_count()
+        report['startup_seconds'] = visualizer.startup_times
+        visualizer.save_video(partial, options['codec'], options['crf'], options['pix_fmt'], options['backend'],
+                              buffers=options['buffers'], preset=options['preset'])
+        visualizer.cleanup()
+        os.replace(partial, output)
+        report['render_seconds'] = time.perf_counter() - loaded
+        report['time_to_first_frame'] = visualizer.time_to_first_frame
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = f"{type(e).__name__}: {e}"
+        report['traceback'] = traceback.format_exc()
+        if os.path.exists(partial):
+            os.remove(partial)
+    report['total_seconds'] = time.perf_counter() - started
+    return report
+
+
+def failed_report(midi_file, output, error):
+    """Report for a file whose worker never returned one"""
+    return {'input': midi_file, 'output': output, 'status': 'failed', 'error': error}
+
+
+def run_worker_pool(pending, jobs, options, record):
+    """Convert (midi_file, output, source_hash) items on a fresh pool, passing each report to `record`.
+    
+    Returns the items that never finished because a worker process died
+    and broke the pool, in submission order.
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(convert_midi_file, midi_file, output, options): (midi_file, output, source_hash)
+                   for midi_file, output, source_hash in pending}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                report = future.result()
+            except BrokenProcessPool:
+                unfinished.append(item)
+                continue
+            except Exception as e:
+                report = failed_report(item[0], item[1], f"{type(e).__name__}: {e}")
+            record(item, report)
+    return sorted(unfinished, key=pending.index)
+
+
+def batch_convert(pattern, out_dir, jobs=1, use_hash=False, **options):
+    """Render every MIDI file matched by `pattern` into out_dir on a worker pool.
+    
+    Outputs newer than their MIDI file (or, with use_hash, made from a file
+    with the same content hash) are skipped, so an interrupted batch resumes
+    where it stopped. Videos keep their input's path below the directory
+    (or the glob's fixed prefix), so students/*/part.mid becomes
+    out_dir/<student>/part.mp4, and each gets a <name>.json report next to
+    it. Inputs that would still share an output are rejected before any
+    work starts. A file whose worker process dies gets a failed report and
+    the rest of the batch carries on.
+    """
+    root = batch_root(pattern)
+    outputs = {}
+    for midi_file in find_midi_files(pattern):
+        output = os.path.join(out_dir, os.path.splitext(os.path.relpath(midi_file, root))[0] + '.mp4')
+        if output in outputs:
+            raise ValueError(f"{outputs[output]} and {midi_file} would both be rendered to {output}")
+        outputs[output] = midi_file
+    
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, 'batch_manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+    
+    pending = []
+    for output, midi_file in outputs.items():
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        source_hash = file_hash(midi_file) if use_hash else None
+        if os.path.exists(output):
+            if use_hash:
+                up_to_date = manifest.get(output, {}).get('hash') == source_hash
+            else:
+                up_to_date = os.path.getmtime(output) >= os.path.getmtime(midi_file)
+            if up_to_date:
+                print(f"Up to date: {output}")
+                continue
+        pending.append((midi_file, output, source_hash))
+    
+    print(f"Converting {len(pending)} files with {jobs} workers...")
+    failures = 0
+    
+    def record(item, report):
+        nonlocal failures
+        midi_file, output, source_hash = item
+        with open(os.path.splitext(output)[0] + '.json', 'w') as file:
+            json.dump(report, file, indent=2)
+        
+        if report['status'] == 'ok':
+            manifest[output] = {'input': report['input'], 'hash': source_hash}
+            print(f"Converted {report['input']} in {report['total_seconds']:.1f}s")
         else:
-            print("No frames captured. Video not saved.")
+            failures += 1
+            print(f"Failed {report['input']}: {report['error']}")
+        
+        # Rewrite the manifest after every file so a killed run can resume
+        with open(manifest_path + '.tmp', 'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    
+    remaining = pending
+    while remaining:
+        unfinished = run_worker_pool(remaining, jobs, options, record)
+        # A worker that dies breaks the whole pool. The pool only hands out
+        # jobs + 1 files ahead, so the culprit is among the first unfinished
+        # ones: retry those alone to find it, the rest on a fresh pool.
+        suspects, remaining = unfinished[:jobs + 1], unfinished[jobs + 1:]
+        for item in suspects:
+            if run_worker_pool([item], 1, options, record):
+                record(item, failed_report(item[0], item[1], "worker process died"))
+    
+    print(f"Batch finished: {len(pending) - failures} converted, {failures} failed")
+    return failures
+
+
+def window_size(text):
+    """argparse type for WIDTHxHEIGHT"""
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    return width, height
 
 
 def main():
-    midi_file = "test.mid"
+    parser = argparse.ArgumentParser(description="Saxophone MIDI Visualizer")
+    parser.add_argument('midi_file', nargs='?', default="test.mid")
+    parser.add_argument('--output', help="render to this video file instead of opening a window")
+    parser.add_argument('--codec', help="encoder codec (ffmpeg codec name or OpenCV fourcc)")
+    parser.add_argument('--crf', type=int, default=18)
+    parser.add_argument('--pix-fmt', default='yuv420p')
+    parser.add_argument('--preset', help="ffmpeg encoder preset, e.g. ultrafast for real-time 1080p on one core")
+    parser.add_argument('--backend', choices=['auto', 'ffmpeg', 'opencv'], default='auto')
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes for --output")
+    parser.add_argument('--frame-buffers', type=int, default=4,
+                        help="frames queued for the background encoder (0 encodes on the render thread)")
+    parser.add_argument('--fps', type=int, default=60, help="target refresh rate or video frame rate")
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help="present only the changed regions of the window each frame")
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB', help="render every MIDI file in a directory or glob")
+    parser.add_argument('--out-dir', default='videos', help="output directory for --batch")
+    parser.add_argument('--hash', action='store_true',
+                        help="with --batch, decide what is up to date by content hash instead of mtime")
+    parser.add_argument('--cache-dir', default=os.path.join(os.path.expanduser('~'), '.cache', 'saxophonehero'),
+                        help="where parsed note data is cached between runs")
+    parser.add_argument('--no-cache', action='store_true', help="always parse the MIDI file")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report import and initialization time per stage up to the first frame")
+    parser.add_argument('--trace', metavar='JSON', help="record timing spans and write them as a Chrome trace")
+    parser.add_argument('--trace-memory', action='store_true', help="with --trace, record peak memory per span")
+    parser.add_argument('--hud', action='store_true', help="show frame time, visible notes and dropped frames")
+    parser.add_argument('--raster', choices=['pygame', 'numpy'], default='pygame',
+                        help="note renderer for --output and --batch")
+    parser.add_argument('--size', type=window_size, default=(1600, 900), metavar='WIDTHxHEIGHT',
+                        help="window or video size")
+    parser.add_argument('--parts', choices=['track', 'channel'],
+                        help="ensemble mode: one band with its own lanes and chart per track or channel")
+    parser.add_argument('--start-bar', type=int, help="start playback in the window at this bar, counting from 1")
+    parser.add_argument('--stream', action='store_true',
+                        help="play raw MIDI bytes (not a Standard MIDI File) from midi_file as they arrive: "
+                             "'-' for stdin, a FIFO or a growing file")
+    args = parser.parse_args()
+    if args.stream and (args.output or args.batch):
+        parser.error("--stream plays in the window and cannot be combined with --output or --batch")
+    if args.start_bar and (args.stream or args.output or args.batch):
+        parser.error("--start-bar only applies to playing a file in the window")
+    if args.stream and args.parts:
+        parser.error("--parts needs the whole file and cannot be combined with --stream")
+    cache_dir = None if args.no_cache else args.cache_dir
+    
+    if args.batch:
+        try:
+            failures = batch_convert(args.batch, args.out_dir, args.jobs, args.hash, fps=args.fps, codec=args.codec,
+                                     crf=args.crf, pix_fmt=args.pix_fmt, backend=args.backend, cache_dir=cache_dir,
+                                     raster=args.raster, buffers=args.frame_buffers, preset=args.preset,
+                                     window_size=args.size,
+                                     parts=args.parts)
+        except ValueError as e:
+            parser.error(str(e))
+        raise SystemExit(1 if failures else 0)
+    
+    profiler = Profiler(enabled=bool(args.trace), track_memory=args.trace_memory)
     try:
-        visualizer = SaxophoneVisualizer(midi_file, scroll_speed=2)
-        visualizer.run()
+        visualizer = SaxophoneVisualizer(args.midi_file, args.size, scroll_speed=2, headless=bool(args.output),
+                                         fps=args.fps, dirty_updates=args.dirty_rects, cache_dir=cache_dir,
+                                         profile_startup=args.profile_startup, profiler=profiler, hud=args.hud,
+                                         raster=args.raster if args.output else 'pygame', stream=args.stream,
+                                         parts=args.parts)
+        if args.start_bar:
+            visualizer.seek_bar(args.start_bar - 1)
+        if args.output:
+            visualizer.save_video(args.output, args.codec, args.crf, args.pix_fmt, args.backend, args.jobs,
+                                  args.frame_buffers, args.preset)
+            visualizer.cleanup()
+        else:
+            visualizer.run()
     except Exception as e:
         print(f"An error occurred: {e}")
-        import traceback
         traceback.print_exc()
+    finally:
+        if args.trace:
+            profiler.export(args.trace)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file